@@ -1,5 +1,10 @@
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+import openai
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from streamlit_webrtc import WebRtcMode, webrtc_streamer
 import focus_detection as fd
 import quiz_generation as qg
@@ -7,10 +12,140 @@ import dashboard as db
 import constants as const
 from constants import config
 import html_integration as hi
+import ingest
+import live_sessions
+import timings
+
+
+def run_with_progress(jobs):
+    # Run each job (label, function) on its own thread with a progress bar per job.
+    # The functions report progress through a callback; the bars are only touched
+    # from the script thread, which polls the latest values.
+    progress = {name: 0.0 for name in jobs}
+    bars = {name: st.progress(0.0, text=label) for name, (label, _) in jobs.items()}
+    ctx = get_script_run_ctx()
+
+    def report(name):
+        def update(fraction):
+            progress[name] = fraction
+        return update
+
+    with ThreadPoolExecutor(max_workers=max(1, len(jobs)),
+                            initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)) as executor:
+        futures = {name: executor.submit(function, progress=report(name))
+                   for name, (_, function) in jobs.items()}
+        while wait(futures.values(), timeout=0.2).not_done:
+            for name, bar in bars.items():
+                bar.progress(progress[name], text=jobs[name][0])
+        results = {name: future.result() for name, future in futures.items()}
+
+    for bar in bars.values():
+        bar.empty()
+    return results
+
+
+def holding(video, function):
+    # Give a job its own reference to an ingested video, released when the job is done
+    video.acquire()
+
+    def run(**kwargs):
+        with video:
+            return function(**kwargs)
+    return run
+
+
+def show_timings():
+    # Rolling per-stage timings of this server process, with a JSON download
+    with st.sidebar.expander("⏱️ Stage Timings"):
+        stats = timings.summary()
+        if not stats:
+            st.write("No stages timed yet.")
+            return
+        st.dataframe(
+            [{"stage": name, "count": stage["count"], "p50 (ms)": round(stage["p50_ms"], 2),
+              "p95 (ms)": round(stage["p95_ms"], 2), "p99 (ms)": round(stage["p99_ms"], 2)}
+             for name, stage in stats.items()],
+            hide_index=True,
+        )
+        st.download_button("Download Timings (JSON)", timings.to_json(), file_name="stage_timings.json", mime="application/json")
+
+
+def show_live_stats(processor):
+    # Totals of the running webcam session; they refresh whenever the page reruns
+    summary = processor.summary
+    with st.expander("📊 Live Session", expanded=True):
+        if not summary.frames:
+            st.write("No frames scored yet.")
+        else:
+            columns = st.columns(4)
+            columns[0].metric("Average Focus", f"{summary.mean_score:.1f}%")
+            columns[1].metric("Frames Scored", summary.frames)
+            columns[2].metric("Frames Dropped", processor.frames_dropped)
+            columns[3].metric("Front Camera", f"{summary.front_camera_shares()[0]:.0f}%")
+            st.caption(f"FaceMesh ran on {processor.frames_inferred} frames; "
+                       f"the motion gate reused the previous result on {processor.frames_reused}.")
+        if processor.errors:
+            st.warning(f"{processor.errors} frames could not be analysed. Last error: {processor.last_error}")
+        st.button("Refresh", key="refresh_live_stats")
+
+
+def show_report():
+    # Dashboard, downloadable HTML report and retake button once the quiz is submitted
+    avg_focus_score_before_quiz = st.session_state.avg_focus_score_before_quiz
+    avg_focus_score_after_quiz = st.session_state.avg_focus_score_after_quiz
+
+    # Show detailed dashboard
+    db.create_dashboard(st.session_state.results_df, avg_focus_score_before_quiz, avg_focus_score_after_quiz)
+
+    # Line chart data; every other report statistic comes from the session summary
+    df = st.session_state.results_df
+    summary = df.attrs['summary']
+    labels_linechart = df['timestamp_min'].to_numpy()
+    data_linechart = df['focus_score'].to_numpy()
+
+    # Quiz results
+    table_data = []
+    for i, (user_answer, question) in enumerate(zip(st.session_state.user_answers, st.session_state.quiz['questions']), 1):
+        is_correct = user_answer == question['correct_answer']
+        status = "Correct" if is_correct else "Wrong"
+        score = "100%" if is_correct else "0%"
+        table_data.append({
+            "question": question['question'],
+            "status": status,
+            "score": score
+        })
+
+    # Generate HTML report
+    template_path = "templates/index.html"  # Path to your HTML template
+    chart_data = summary.chart_data(labels_linechart, data_linechart)
+    scores = summary.scores(avg_focus_score_after_quiz)
+    populated_html = hi.generate_html_from_template(template_path, chart_data, scores, table_data)
+
+    # Provide Download Button
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".html") as tmp_file:
+        tmp_file.write(populated_html.encode("utf-8"))
+        tmp_file_path = tmp_file.name
+
+    st.download_button(
+        label="💾 Download HTML Report",
+        data=open(tmp_file_path, "rb").read(),
+        file_name="focus_analysis_report.html",
+        mime="text/html",
+    )
+
+    # Allow users to retake the quiz
+    if st.button("Retake Quiz"):
+        # Reset quiz variables to allow retaking
+        for i in range(len(st.session_state.quiz['questions'])):
+            if f"q{i}" in st.session_state:
+                del st.session_state[f"q{i}"]
+        st.session_state.quiz_submitted = False
+        st.session_state.user_answers = None
 
 
 def app():
     st.title("📊 AI Platform for Focus Analysis")
+    ingest.sweep_stale_uploads()
     st.sidebar.header("🔧 Configuration")
 
     # Sidebar for configuration
@@ -18,6 +153,10 @@ def app():
     config.DISCOUNT_SIDE = st.sidebar.slider("Side Look Discount (%)", 1, 50, 1, key="discount_side")
     config.BLINK_THRESHOLD = st.sidebar.slider("Blink Threshold (seconds)", 1, 50, 3, key="blink_threshold")
     config.DISCOUNT_EYES = st.sidebar.slider("Closed Eyes Discount (%)", 5, 50, 1, key="discount_eyes")
+    config.ANALYSIS_FPS = st.sidebar.slider("Analysis Rate (frames/second)", 1, 30, 5, key="analysis_fps")
+    config.TIMINGS_ENABLED = st.sidebar.checkbox("Record Stage Timings", config.TIMINGS_ENABLED, key="record_timings")
+    scoring_settings = (config.CENTER_THRESHOLD, config.SIDE_THRESHOLD, config.DISCOUNT_SIDE,
+                        config.BLINK_THRESHOLD, config.DISCOUNT_EYES)
 
     # Initialize session state variables
     if 'quiz_generated' not in st.session_state:
@@ -40,14 +179,26 @@ def app():
         st.session_state.quiz_score = None
     if 'uploaded_filename' not in st.session_state:
         st.session_state.uploaded_filename = None
+    if 'scored_with' not in st.session_state:
+        st.session_state.scored_with = None
+    if 'quiz_adjustment' not in st.session_state:
+        st.session_state.quiz_adjustment = None
+
+    # When the scoring sliders move after an analysis, re-score the stored per-frame
+    # signals instead of reprocessing the video
+    if st.session_state.results_df is not None and st.session_state.scored_with != scoring_settings:
+        fd.rescore_results(st.session_state.results_df)
+        st.session_state.scored_with = scoring_settings
+        st.session_state.avg_focus_score_before_quiz = st.session_state.results_df.attrs['summary'].mean_score
+        if st.session_state.quiz_adjustment is not None:
+            st.session_state.avg_focus_score_after_quiz = min(100, max(0, st.session_state.avg_focus_score_before_quiz + st.session_state.quiz_adjustment))
 
     # Ask for OpenAI API key
     const.openai_api_key = st.text_input("Enter your OpenAI API key:", type="password")
     if const.openai_api_key:
-        qg.openai.api_key = const.openai_api_key
-        # Load the Whisper model if not already loaded
-        if const.model is None:
-            const.model = qg.whisper.load_model("base")
+        openai.api_key = const.openai_api_key
+        # Start loading the Whisper model while the user picks a video
+        qg.warm_up_whisper_model()
     else:
         st.warning("Please enter your OpenAI API key to proceed.")
 
@@ -57,15 +208,17 @@ def app():
     with tab1:
         st.header("🔴 Webcam Feed")
         st.write(f"Current Focus Score: {st.session_state.focus_score}%")
-        webrtc_streamer(
+        ctx = webrtc_streamer(
             key="camera",
             mode=WebRtcMode.SENDRECV,
             media_stream_constraints={
                 "video": True,
                 "audio": False,
             },
-            video_frame_callback=fd.video_frame_callback,
+            video_processor_factory=partial(fd.FocusVideoProcessor, live_sessions.get_session_manager()),
         )
+        if ctx.video_processor is not None:
+            show_live_stats(ctx.video_processor)
 
     with tab2:
         st.header("📥 Upload Video for Analysis and Quiz")
@@ -81,35 +234,46 @@ def app():
                 st.session_state.quiz_generated = False
                 st.session_state.quiz_submitted = False
                 st.session_state.user_answers = None
+                st.session_state.quiz_adjustment = None
+                st.session_state.pop("dashboard_zoom", None)
                 st.session_state.uploaded_filename = uploaded_file.name
                 st.session_state.focus_score = 50  # Reset focus score to 50
             st.video(uploaded_file)
 
             if st.button("🔍 Analyze Video and Generate Quiz"):
-                # Process video only if not already processed
-                if st.session_state.results_df is None:
-                    with st.spinner("Analyzing video..."):
-                        results_df = fd.process_uploaded_video(uploaded_file)
-                        st.session_state.results_df = results_df  # Store in session state
-                        st.success("✅ Analysis complete!")
-                        st.session_state.avg_focus_score_before_quiz = results_df['focus_score'].mean()
-                else:
+                analyze = st.session_state.results_df is None
+                transcribe = st.session_state.quiz is None
+                if not analyze:
                     st.success("Video already analyzed.")
-                    results_df = st.session_state.results_df
-                    st.session_state.avg_focus_score_before_quiz = results_df['focus_score'].mean()
-
-                # Generate quiz only if not already generated
-                if st.session_state.quiz is None:
-                    with st.spinner("Processing video for quiz generation..."):
-                        transcription = qg.process_video_to_text(uploaded_file)
-                        if transcription:
-                            with st.spinner("Generating quiz..."):
-                                st.session_state.quiz = qg.generate_quiz_from_text(transcription)
-                                if st.session_state.quiz:
-                                    st.session_state.quiz_generated = True
-                else:
+                if not transcribe:
                     st.success("Quiz already generated.")
                     st.session_state.quiz_generated = True
+                results = {}
+                if analyze or transcribe:
+                    # Spool the upload to disk once; analysis and transcription each hold the file
+                    with ingest.ingest_upload(uploaded_file) as video:
+                        # Focus analysis and transcription are independent, so they run side by side
+                        jobs = {}
+                        if analyze:
+                            jobs["analysis"] = ("Analyzing video...", holding(video, partial(fd.process_uploaded_video, video.path, video_digest=video.digest)))
+                        if transcribe:
+                            jobs["transcription"] = ("Processing video for quiz generation...", holding(video, partial(qg.process_video_to_text, video.path)))
+                        results = run_with_progress(jobs)
+
+                if "analysis" in results:
+                    st.session_state.results_df = results["analysis"]  # Store in session state
+                    st.session_state.scored_with = scoring_settings
+                    st.success("✅ Analysis complete!")
+                results_df = st.session_state.results_df
+                st.session_state.avg_focus_score_before_quiz = results_df.attrs['summary'].mean_score
+
+                # Generate quiz only if not already generated
+                transcription = results.get("transcription")
+                if transcription:
+                    with st.spinner("Generating quiz..."):
+                        st.session_state.quiz = qg.generate_quiz_from_text(transcription)
+                        if st.session_state.quiz:
+                            st.session_state.quiz_generated = True
 
         if st.session_state.quiz_generated and not st.session_state.quiz_submitted:
             st.session_state.user_answers = qg.display_quiz(st.session_state.quiz)
@@ -120,6 +284,7 @@ def app():
                 st.session_state.focus_score, adjustment = qg.adjust_focus_score_based_on_quiz(st.session_state.quiz, st.session_state.user_answers, st.session_state.focus_score)
                 st.session_state.quiz_submitted = True
                 st.session_state.quiz_score = final_score  # Store quiz score
+                st.session_state.quiz_adjustment = adjustment
 
                 # Calculate average focus score after quiz
                 avg_focus_score_before_quiz = st.session_state.avg_focus_score_before_quiz
@@ -142,185 +307,15 @@ def app():
                     unsafe_allow_html=True
                 )
 
-                # Show detailed dashboard
-                db.create_dashboard(st.session_state.results_df, avg_focus_score_before_quiz, avg_focus_score_after_quiz)
-
-                # Prepare data for HTML report
-                df = st.session_state.results_df
-
-                # Line chart data
-                labels_linechart = df['timestamp_min'].round(2).tolist()
-                data_linechart = df['focus_score'].tolist()
-
-                # Eye direction pie chart data
-                eye_detected_df = df[~df['eye_direction'].isin(['Not Detected', 'Unknown', 'Blink'])]
-                total_eye_detected_time = eye_detected_df['delta_time'].sum()
-                eye_direction_times = eye_detected_df.groupby('eye_direction')['delta_time'].sum()
-                eye_direction_percentages = ((eye_direction_times / total_eye_detected_time) * 100).round(2).tolist()
-                eye_direction_labels = eye_direction_times.index.tolist()
-
-                # Face position pie chart data
-                face_detected_df = df[df['face_position'] != 'Not Detected']
-                total_face_detected_time = face_detected_df['delta_time'].sum()
-                face_position_times = face_detected_df.groupby('face_position')['delta_time'].sum()
-                face_position_percentages = ((face_position_times / total_face_detected_time) * 100).round(2).tolist()
-                face_position_labels = face_position_times.index.tolist()
-
-                # Front camera vs not front camera pie chart data
-                front_camera_time = df[df['is_front_camera']]['delta_time'].sum()
-                not_front_camera_time = df[~df['is_front_camera']]['delta_time'].sum()
-                total_time = front_camera_time + not_front_camera_time
-                front_camera_percentage = (front_camera_time / total_time * 100).round(2)
-                not_front_camera_percentage = (not_front_camera_time / total_time * 100).round(2)
-
-                # Scores
-                max_focus_score = df['focus_score'].max()
-                min_focus_score = df['focus_score'].min()
-                avg_focus_score_before_quiz = st.session_state.avg_focus_score_before_quiz
-                avg_focus_score_after_quiz = st.session_state.avg_focus_score_after_quiz
-
-                # Quiz results
-                table_data = []
-                for i, (user_answer, question) in enumerate(zip(st.session_state.user_answers, st.session_state.quiz['questions']), 1):
-                    is_correct = user_answer == question['correct_answer']
-                    status = "Correct" if is_correct else "Wrong"
-                    score = "100%" if is_correct else "0%"
-                    table_data.append({
-                        "question": question['question'],
-                        "status": status,
-                        "score": score
-                    })
-
-                # Generate HTML report
-                template_path = "templates/index.html"  # Path to your HTML template
-                chart_data = {
-                    "line_chart": {"labels": labels_linechart, "data": data_linechart},
-                    "pie_chart1": {"labels": eye_direction_labels, "data": eye_direction_percentages},
-                    "pie_chart2": {"labels": face_position_labels, "data": face_position_percentages},
-                    "pie_chart3": {"labels": ["Front Camera", "Not Front Camera"], "data": [front_camera_percentage, not_front_camera_percentage]},
-                }
-                scores = {
-                    "final": f"{avg_focus_score_after_quiz:.2f}%",
-                    "highest_continuous": f"{max_focus_score:.2f}%",
-                    "min": f"{min_focus_score:.2f}%",
-                    "after_quiz": f"{avg_focus_score_after_quiz:.2f}%",
-                }
-                populated_html = hi.generate_html_from_template(template_path, chart_data, scores, table_data)
-
-                # Provide Download Button
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".html") as tmp_file:
-                    tmp_file.write(populated_html.encode("utf-8"))
-                    tmp_file_path = tmp_file.name
-
-                st.download_button(
-                    label="💾 Download HTML Report",
-                    data=open(tmp_file_path, "rb").read(),
-                    file_name="focus_analysis_report.html",
-                    mime="text/html",
-                )
-
-                # Allow users to retake the quiz
-                if st.button("Retake Quiz"):
-                    # Reset quiz variables to allow retaking
-                    for i in range(len(st.session_state.quiz['questions'])):
-                        if f"q{i}" in st.session_state:
-                            del st.session_state[f"q{i}"]
-                    st.session_state.quiz_submitted = False
-                    st.session_state.user_answers = None
+                show_report()
 
         elif st.session_state.quiz_submitted:
             # If quiz already submitted, show the dashboard and allow retake
-            avg_focus_score_before_quiz = st.session_state.avg_focus_score_before_quiz
-            avg_focus_score_after_quiz = st.session_state.avg_focus_score_after_quiz
-            final_score = st.session_state.quiz_score
-
-            # Show detailed dashboard
-            db.create_dashboard(st.session_state.results_df, avg_focus_score_before_quiz, avg_focus_score_after_quiz)
-
-            # Generate HTML report
-            df = st.session_state.results_df
-
-            # Line chart data
-            labels_linechart = df['timestamp_min'].round(2).tolist()
-            data_linechart = df['focus_score'].tolist()
-
-            # Eye direction pie chart data
-            eye_detected_df = df[~df['eye_direction'].isin(['Not Detected', 'Unknown', 'Blink'])]
-            total_eye_detected_time = eye_detected_df['delta_time'].sum()
-            eye_direction_times = eye_detected_df.groupby('eye_direction')['delta_time'].sum()
-            eye_direction_percentages = ((eye_direction_times / total_eye_detected_time) * 100).round(2).tolist()
-            eye_direction_labels = eye_direction_times.index.tolist()
-
-            # Face position pie chart data
-            face_detected_df = df[df['face_position'] != 'Not Detected']
-            total_face_detected_time = face_detected_df['delta_time'].sum()
-            face_position_times = face_detected_df.groupby('face_position')['delta_time'].sum()
-            face_position_percentages = ((face_position_times / total_face_detected_time) * 100).round(2).tolist()
-            face_position_labels = face_position_times.index.tolist()
-
-            # Front camera vs not front camera pie chart data
-            front_camera_time = df[df['is_front_camera']]['delta_time'].sum()
-            not_front_camera_time = df[~df['is_front_camera']]['delta_time'].sum()
-            total_time = front_camera_time + not_front_camera_time
-            front_camera_percentage = (front_camera_time / total_time * 100).round(2)
-            not_front_camera_percentage = (not_front_camera_time / total_time * 100).round(2)
-
-            # Scores
-            max_focus_score = df['focus_score'].max()
-            min_focus_score = df['focus_score'].min()
-            avg_focus_score_before_quiz = st.session_state.avg_focus_score_before_quiz
-            avg_focus_score_after_quiz = st.session_state.avg_focus_score_after_quiz
-
-            # Quiz results
-            table_data = []
-            for i, (user_answer, question) in enumerate(zip(st.session_state.user_answers, st.session_state.quiz['questions']), 1):
-                is_correct = user_answer == question['correct_answer']
-                status = "Correct" if is_correct else "Wrong"
-                score = "100%" if is_correct else "0%"
-                table_data.append({
-                    "question": question['question'],
-                    "status": status,
-                    "score": score
-                })
-
-            # Generate HTML report
-            template_path = "templates/index.html"  # Path to your HTML template
-            chart_data = {
-                "line_chart": {"labels": labels_linechart, "data": data_linechart},
-                "pie_chart1": {"labels": eye_direction_labels, "data": eye_direction_percentages},
-                "pie_chart2": {"labels": face_position_labels, "data": face_position_percentages},
-                "pie_chart3": {"labels": ["Front Camera", "Not Front Camera"], "data": [front_camera_percentage, not_front_camera_percentage]},
-            }
-            scores = {
-                "final": f"{avg_focus_score_after_quiz:.2f}%",
-                "highest_continuous": f"{max_focus_score:.2f}%",
-                "min": f"{min_focus_score:.2f}%",
-                "after_quiz": f"{avg_focus_score_after_quiz:.2f}%",
-            }
-            populated_html = hi.generate_html_from_template(template_path, chart_data, scores, table_data)
-
-            # Provide Download Button
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".html") as tmp_file:
-                tmp_file.write(populated_html.encode("utf-8"))
-                tmp_file_path = tmp_file.name
-
-            st.download_button(
-                label="💾 Download HTML Report",
-                data=open(tmp_file_path, "rb").read(),
-                file_name="focus_analysis_report.html",
-                mime="text/html",
-            )
-
-            # Allow users to retake the quiz
-            if st.button("Retake Quiz"):
-                # Reset quiz variables to allow retaking
-                for i in range(len(st.session_state.quiz['questions'])):
-                    if f"q{i}" in st.session_state:
-                        del st.session_state[f"q{i}"]
-                st.session_state.quiz_submitted = False
-                st.session_state.user_answers = None
+            show_report()
 
     st.sidebar.write(f"Focus Score: {st.session_state.focus_score}%")
+    if config.TIMINGS_ENABLED:
+        show_timings()
 
 if __name__ == "__main__":
     app()
\ No newline at end of file
@@ -0,0 +1,173 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2 as cv
+
+import classroom
+import focus_detection as fd
+import html_integration as hi
+import ingest
+import timings
+from constants import config
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov")
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "index.html")
+
+# Headless analysis of whole folders of videos, e.g.
+#   python batch_analyze.py course_videos/ --output reports/ --workers 4
+# Each video gets a signals file and an HTML report (and a transcript with --transcribe)
+# under the output folder, mirroring the input layout. Videos whose outputs all exist
+# are skipped, so an interrupted run can simply be started again. With --classroom,
+# every face in a room camera's video is scored as its own student: the signals file
+# has one row per frame and student, and a per-student summary CSV replaces the report.
+
+
+def find_videos(inputs):
+    for root in inputs:
+        if os.path.isfile(root):
+            yield os.path.dirname(root), root
+            continue
+        for folder, _, files in os.walk(root):
+            for name in sorted(files):
+                if name.lower().endswith(VIDEO_EXTENSIONS):
+                    yield root, os.path.join(folder, name)
+
+
+def output_paths(root, video_path, output_dir, signal_format, transcribe, classroom_mode=False):
+    stem = os.path.splitext(os.path.join(output_dir, os.path.relpath(video_path, root)))[0]
+    if classroom_mode:
+        paths = {"signals": f"{stem}.classroom.{signal_format}", "students": f"{stem}.students.csv"}
+    else:
+        paths = {"signals": f"{stem}.{signal_format}", "report": f"{stem}.html"}
+    if transcribe:
+        paths["transcript"] = f"{stem}.txt"
+    return paths
+
+
+def write_signals(df, path, signal_format):
+    df = df.copy(deep=False)
+    df.attrs = {}  # The summary object is not serializable, and is rebuilt from the columns anyway
+    if signal_format == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_json(path, orient="split", index=False)
+
+
+def write_report(df, path):
+    # Batch reports have no quiz, so the final score is the average focus score
+    summary = df.attrs['summary']
+    chart_data = summary.chart_data(df['timestamp_min'].to_numpy(), df['focus_score'].to_numpy())
+    scores = summary.scores(summary.mean_score)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(hi.generate_html_from_template(TEMPLATE_PATH, chart_data, scores, []))
+
+
+def _init_worker(settings):
+    # The parent's configuration, including --timings, in place of the spawned worker's defaults
+    vars(config).update(settings)
+
+
+def analyze_video(video_path, paths, analysis_fps, signal_format, classroom_mode=False):
+    # Runs in a pool worker: one video, analysed in this process only
+    start = time.perf_counter()
+    for path in paths.values():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if classroom_mode:
+        df = classroom.process_classroom_video(video_path, analysis_fps)
+        write_signals(df, paths["signals"], signal_format)
+        classroom.student_summary(df).to_csv(paths["students"])
+        frames = df.attrs['frames_analysed']
+        note = f"{df['student'].nunique()} students"
+    else:
+        df = fd.process_uploaded_video(video_path, analysis_fps, workers=1, video_digest=ingest.file_digest(video_path))
+        write_signals(df, paths["signals"], signal_format)
+        write_report(df, paths["report"])
+        frames = len(df)
+        note = f"{df.attrs['frames_reused']} reused by the motion gate"
+
+    if "transcript" in paths:
+        import quiz_generation as qg  # Only batch runs that transcribe need Whisper
+        text = qg.process_video_to_text(video_path)
+        if text is None:
+            raise RuntimeError("transcription failed")
+        with open(paths["transcript"], "w", encoding="utf-8") as f:
+            f.write(text)
+
+    cap = cv.VideoCapture(video_path)
+    video_frames = max(0, int(cap.get(cv.CAP_PROP_FRAME_COUNT)))  # Every frame is decoded, analysed or not
+    cap.release()
+    duration = float(df['timestamp'].iloc[-1] - df['timestamp'].iloc[0]) if len(df) else 0.0
+    return frames, video_frames, note, duration, time.perf_counter() - start, timings.drain()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze folders of videos without the web app.")
+    parser.add_argument("inputs", nargs="+", help="Video files or folders searched recursively")
+    parser.add_argument("--output", "-o", required=True, help="Folder for signals, reports and transcripts")
+    parser.add_argument("--workers", "-j", type=int, default=config.ANALYSIS_WORKERS, help="Videos analysed at once")
+    parser.add_argument("--analysis-fps", type=float, default=config.ANALYSIS_FPS, help="Frames per second analysed")
+    parser.add_argument("--format", choices=["parquet", "json"], default="parquet", help="Signals file format")
+    parser.add_argument("--transcribe", action="store_true", help="Also write a Whisper transcript per video")
+    parser.add_argument("--classroom", action="store_true", help="Score every face in the video as its own student")
+    parser.add_argument("--force", action="store_true", help="Re-analyze videos that already have outputs")
+    parser.add_argument("--timings", metavar="PATH", help="Write per-stage timings of all workers to this JSON file")
+    args = parser.parse_args(argv)
+    config.TIMINGS_ENABLED = bool(args.timings)
+
+    jobs = []
+    skipped = 0
+    for root, video_path in find_videos(args.inputs):
+        paths = output_paths(root, video_path, args.output, args.format, args.transcribe, args.classroom)
+        if not args.force and all(os.path.exists(path) for path in paths.values()):
+            skipped += 1
+        else:
+            jobs.append((video_path, paths))
+    print(f"{len(jobs)} videos to analyze, {skipped} already done")
+    if not jobs:
+        return 0
+
+    start = time.perf_counter()
+    frames = 0
+    decoded_frames = 0
+    video_seconds = 0.0
+    failed = 0
+    workers = max(1, min(args.workers, len(jobs)))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(vars(config),)) as executor:
+        futures = {
+            executor.submit(analyze_video, video_path, paths, args.analysis_fps, args.format, args.classroom): video_path
+            for video_path, paths in jobs
+        }
+        for future in as_completed(futures):
+            video_path = futures[future]
+            try:
+                analysed, video_frames, note, duration, elapsed, video_timings = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"FAILED {video_path}: {e}")
+                continue
+            timings.merge(video_timings)
+            frames += analysed
+            decoded_frames += video_frames
+            video_seconds += duration
+            print(f"{video_path}: {analysed} of {video_frames} frames analysed ({note}), "
+                  f"{duration:.0f} s of video in {elapsed:.1f} s")
+
+    elapsed = time.perf_counter() - start
+    done = len(jobs) - failed
+    print(f"{done} videos ({failed} failed) in {elapsed:.1f} s with {workers} workers: "
+          f"{done / elapsed * 3600:.1f} videos/hour, {frames / elapsed:.1f} analysed frames/sec "
+          f"({decoded_frames / elapsed:.1f} video frames/sec), "
+          f"{video_seconds / elapsed:.1f}x real time")
+    if args.timings:
+        with open(args.timings, "w", encoding="utf-8") as f:
+            f.write(timings.to_json())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
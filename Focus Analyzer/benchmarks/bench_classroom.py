@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import cv2 as cv
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import classroom
+import focus_detection as fd
+
+# Per-frame cost of classroom analysis (landmark parsing, batched pose and eye features,
+# tracking and scoring) as the number of faces grows. FaceMesh itself is left out: the
+# faces of a real recording are replayed, copied into a grid across a 1080p frame.
+
+FRAME = np.zeros((1080, 1920, 3), dtype=np.uint8)
+
+
+def recorded_faces(video_path, frames=60):
+    cap = cv.VideoCapture(video_path)
+    faces = []
+    with fd.create_face_mesh() as face_mesh:
+        while len(faces) < frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            results = face_mesh.process(cv.cvtColor(cv.flip(frame, 1), cv.COLOR_BGR2RGB))
+            if results.multi_face_landmarks:
+                faces.append(fd.landmark_array(results.multi_face_landmarks[0]))
+    cap.release()
+    return faces
+
+
+def classroom_results(points, faces):
+    # The recorded face shrunk into each cell of a grid, as FaceMesh would report it
+    columns = int(np.ceil(np.sqrt(faces)))
+    cell = 1 / columns
+    results = []
+    for face in range(faces):
+        row, column = divmod(face, columns)
+        moved = points.copy()
+        moved[:, 0] = (column + moved[:, 0]) * cell
+        moved[:, 1] = (row + moved[:, 1]) * cell
+        landmarks = landmark_pb2.NormalizedLandmarkList()
+        for x, y, z in moved.tolist():
+            landmarks.landmark.add(x=x, y=y, z=z)
+        results.append(landmarks)
+    return SimpleNamespace(multi_face_landmarks=results)
+
+
+def time_frames(recorded, faces):
+    frames = [classroom_results(points, faces) for points in recorded]
+    analyzer = classroom.ClassroomAnalyzer()
+    analyzer.update(FRAME, frames[0], 0.0)
+    start = time.perf_counter()
+    for index, results in enumerate(frames):
+        analyzer.update(FRAME, results, (index + 1) / 30)
+    return (time.perf_counter() - start) / len(frames)
+
+
+def main():
+    video_path = sys.argv[1] if len(sys.argv) > 1 else "video.mp4"
+    recorded = recorded_faces(video_path)
+    if not recorded:
+        sys.exit(f"no face found in {video_path}")
+
+    single = time_frames(recorded, 1)
+    for faces in (1, 2, 4, 8, 16, 32):
+        seconds = time_frames(recorded, faces)
+        print(f"{faces:3d} faces: {seconds * 1000:7.2f} ms/frame  {seconds / faces * 1e6:8.1f} us/face"
+              f"  ({seconds / (single * faces):4.2f}x of one face per face)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import sys
+import tempfile
+import time
+
+import cv2 as cv
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import focus_detection as fd
+from head_pose import HeadPoseEstimator, NO_DISTORTION
+import synthetic_video
+
+# Per-face cost of the head pose step, on the landmarks of a recording replayed in order:
+# the original from-scratch solve (camera matrix, solvePnP, Rodrigues, RQDecomp3x3) against
+# HeadPoseEstimator, and how far their angles and face_position labels drift apart.
+#
+#   python benchmarks/bench_head_pose.py [video.mp4]
+#
+# Without a video, a synthetic 640x480 recording is used.
+
+VIDEO_DIR = os.path.join(tempfile.gettempdir(), "focus_analyzer_benchmark_videos")
+
+
+def recorded_poses(video_path, frames=600):
+    # Pose landmarks of each frame in order, None where no face was found
+    cap = cv.VideoCapture(video_path)
+    size = (int(cap.get(cv.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv.CAP_PROP_FRAME_HEIGHT)))
+    poses = []
+    with fd.create_face_mesh() as face_mesh:
+        while len(poses) < frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame = cv.flip(frame, 1)
+            results = face_mesh.process(cv.cvtColor(frame, cv.COLOR_BGR2RGB))
+            poses.append(fd.landmarks_detection(frame, results) if results.multi_face_landmarks else None)
+    cap.release()
+    return poses, size
+
+
+def pose_points(points):
+    face_2d = points[fd.POSE_LANDMARKS, :2].astype(np.int32).astype(np.float64)
+    return np.column_stack((face_2d, points[fd.POSE_LANDMARKS, 2])), face_2d
+
+
+def solve_from_scratch(face_3d, face_2d, width, height):
+    cam_matrix = np.array([[width, 0, width / 2], [0, width, height / 2], [0, 0, 1]])
+    success, rot_vec, trans_vec = cv.solvePnP(face_3d, face_2d, cam_matrix, NO_DISTORTION)
+    angles = cv.RQDecomp3x3(cv.Rodrigues(rot_vec)[0])[0]
+    return angles[0], angles[1]
+
+
+def time_poses(poses, size, estimator=None, repeat=5):
+    # Median seconds per face over `repeat` passes through the recording
+    pairs = [pose_points(points) if points is not None else None for points in poses]
+    faces = sum(pair is not None for pair in pairs)
+    durations = []
+    for _ in range(repeat):
+        if estimator:
+            estimator.reset()
+        start = time.perf_counter()
+        for pair in pairs:
+            if pair is None:
+                if estimator:
+                    estimator.reset()
+            elif estimator:
+                estimator.angles(*pair, *size)
+            else:
+                solve_from_scratch(*pair, *size)
+        durations.append(time.perf_counter() - start)
+    return np.median(durations) / faces
+
+
+def main():
+    video_path = sys.argv[1] if len(sys.argv) > 1 else synthetic_video.cached_video(VIDEO_DIR, 640, 480, 20)
+    poses, size = recorded_poses(video_path)
+    faces = [points for points in poses if points is not None]
+    if not faces:
+        sys.exit(f"no face found in {video_path}")
+
+    cold = time_poses(poses, size)
+    warm = time_poses(poses, size, HeadPoseEstimator())
+    print(f"{video_path}: {len(faces)} faces in {len(poses)} frames")
+    print(f"from scratch: {cold * 1e6:7.1f} us/face")
+    print(f"estimator:    {warm * 1e6:7.1f} us/face  ({cold / warm:.2f}x)")
+
+    # Labels and angles as face_signals reports them, with and without the estimator
+    estimator = HeadPoseEstimator()
+    flips, differences = 0, []
+    for points in poses:
+        if points is None:
+            estimator.reset()
+            continue
+        reference = fd.face_signals(points, *size)
+        signals = fd.face_signals(points, *size, estimator)
+        flips += reference.face_position != signals.face_position
+        differences += [abs(signals.pitch - reference.pitch), abs(signals.yaw - reference.yaw)]
+    print(f"face_position changed on {flips} of {len(faces)} faces, "
+          f"largest pitch/yaw difference {max(differences):.4f} (face_signals units)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import focus_detection as fd
+
+# Per-frame cost of analyze_frame outside FaceMesh: FaceMesh is replaced by a stub
+# that returns the same 478-point landmark list every frame. The no-face run only
+# pays for flip and cvtColor, so the difference is the landmark feature pipeline.
+
+
+class StubFaceMesh:
+    def __init__(self, seed=0, face=True):
+        rng = np.random.default_rng(seed)
+        points = rng.uniform(0.35, 0.65, size=(478, 3))
+        landmarks = landmark_pb2.NormalizedLandmarkList(
+            landmark=[landmark_pb2.NormalizedLandmark(x=x, y=y, z=z - 0.5) for x, y, z in points]
+        )
+        self.results = SimpleNamespace(multi_face_landmarks=[landmarks] if face else None)
+
+    def process(self, rgb_frame):
+        return self.results
+
+
+def time_per_frame(frame, face_mesh, frames):
+    for _ in range(100):
+        fd.analyze_frame(frame, face_mesh)
+    start = time.perf_counter()
+    for _ in range(frames):
+        fd.analyze_frame(frame, face_mesh)
+    return (time.perf_counter() - start) / frames
+
+
+def main(frames=5000, width=640, height=480):
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    with_face = time_per_frame(frame, StubFaceMesh(), frames)
+    without_face = time_per_frame(frame, StubFaceMesh(face=False), frames)
+    print(f"analyze_frame, face:    {with_face * 1e6:.1f} us/frame")
+    print(f"analyze_frame, no face: {without_face * 1e6:.1f} us/frame")
+    print(f"landmark features:      {(with_face - without_face) * 1e6:.1f} us/frame")
+
+
+if __name__ == "__main__":
+    main()
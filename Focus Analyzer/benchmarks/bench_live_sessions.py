@@ -0,0 +1,95 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import cv2 as cv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import focus_detection as fd
+import live_sessions
+from constants import config
+import synthetic_video
+
+# Throughput of concurrent live streams analysed in the server process (one thread and
+# one FaceMesh per stream, as FocusVideoProcessor does without a session manager)
+# against a LiveSessionManager's worker processes. Every stream replays its own
+# synthetic video as fast as it is answered; the motion gate is off so every frame
+# runs FaceMesh. Each stream's signals are also checked against the same video
+# analysed alone, so any state leaking between sessions shows up as a mismatch.
+#
+#   python benchmarks/bench_live_sessions.py --streams 1 2 4 8 --workers 4
+
+VIDEO_DIR = os.path.join(tempfile.gettempdir(), "focus_analyzer_benchmark_videos")
+
+
+def load_frames(seed, frames):
+    cap = cv.VideoCapture(synthetic_video.cached_video(VIDEO_DIR, 640, 480, 10, seed=seed))
+    loaded = []
+    while len(loaded) < frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        loaded.append(frame)
+    cap.release()
+    return loaded
+
+
+def in_process(frames):
+    face_mesh = fd.create_face_mesh()
+    head_pose = fd.HeadPoseEstimator()
+    signals = [fd.analyze_frame(frame, face_mesh, head_pose)[1] for frame in frames]
+    face_mesh.close()
+    return signals
+
+
+def in_session(manager, frames):
+    session = manager.open_session()
+    signals = [session.analyze(frame, index / 30) for index, frame in enumerate(frames)]
+    session.close()
+    return signals
+
+
+def run_streams(function, videos):
+    # (frames per second over all streams, signals of each stream)
+    outputs = [None] * len(videos)
+
+    def stream(index):
+        outputs[index] = function(videos[index])
+
+    threads = [threading.Thread(target=stream, args=(index,)) for index in range(len(videos))]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(map(len, videos)) / (time.perf_counter() - start), outputs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare concurrent live streams in process and in worker processes.")
+    parser.add_argument("--streams", nargs="+", type=int, default=[1, 2, 4, 8], help="Concurrent stream counts")
+    parser.add_argument("--workers", type=int, default=config.LIVE_WORKERS or 1, help="Worker processes")
+    parser.add_argument("--frames", type=int, default=150, help="Frames per stream")
+    args = parser.parse_args(argv)
+    config.MOTION_GATE_ENABLED = False
+
+    videos = [load_frames(seed, args.frames) for seed in range(max(args.streams))]
+    alone = [in_process(frames) for frames in videos]
+    manager = live_sessions.LiveSessionManager(args.workers)
+    in_session(manager, videos[0][:1])  # Start the workers before timing
+
+    print(f"{os.cpu_count()} CPUs, {args.workers} workers, {args.frames} frames per stream")
+    print(f"{'streams':>7} {'in process fps':>15} {'workers fps':>12} {'speedup':>8} {'isolated':>9}")
+    for streams in args.streams:
+        local_fps, _ = run_streams(in_process, videos[:streams])
+        worker_fps, outputs = run_streams(lambda frames: in_session(manager, frames), videos[:streams])
+        isolated = all(str(output) == str(expected) for output, expected in zip(outputs, alone))
+        print(f"{streams:7d} {local_fps:15.1f} {worker_fps:12.1f} {worker_fps / local_fps:7.2f}x {'yes' if isolated else 'NO':>9}")
+    manager.close()
+
+
+if __name__ == "__main__":
+    main()
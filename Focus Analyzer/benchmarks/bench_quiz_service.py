@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from quiz_service import QuizService, StubBackend
+
+# Quiz service throughput and latency against the local stub backend, which answers
+# after a fixed delay like a remote model would. A class of students watching the
+# same lecture is many concurrent requests for one transcript.
+
+
+def transcript(n):
+    return f"Lecture {n} covers gradient descent, learning rates and overfitting in neural networks. " * 50
+
+
+def run(service, texts, clients):
+    latencies = []
+
+    def request(text):
+        start = time.perf_counter()
+        service.get_quiz(text)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(request, texts))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(texts) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+def report(name, backend, result):
+    throughput, p50, p95 = result
+    print(f"{name:<28} {throughput:8.1f} quiz/s  p50 {p50 * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms  backend calls {backend.calls}")
+
+
+def main(latency=0.5, students=40, lectures=20, clients=16, max_concurrency=4):
+    backend = StubBackend(latency)
+    service = QuizService(backend, max_concurrency=max_concurrency)
+    report("distinct transcripts, cold", backend, run(service, [transcript(n) for n in range(lectures)], clients))
+    report("same transcripts, cached", backend, run(service, [transcript(n) for n in range(lectures)], clients))
+
+    backend = StubBackend(latency)
+    service = QuizService(backend, max_concurrency=max_concurrency)
+    report("one lecture, whole class", backend, run(service, [transcript(0)] * students, clients))
+
+    # Every call times out, so the request fails once its one retry is used up
+    backend = StubBackend(latency)
+    service = QuizService(backend, max_concurrency=max_concurrency, timeout=latency / 2, retries=1, backoff=0.05)
+    try:
+        service.get_quiz(transcript(0))
+    except TimeoutError:
+        print(f"{'timeout, retries exhausted':<28} backend calls {backend.calls}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import html_integration as hi
+from constants import config
+
+# Render time and size of the HTML report for long recordings, with the focus line
+# downsampled to the configured point budget and with every frame kept.
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "templates", "index.html")
+
+
+def report_inputs(minutes, fps):
+    frames = int(minutes * 60 * fps)
+    rng = np.random.default_rng(0)
+    chart_data = {
+        "line_chart": {
+            "labels": np.arange(frames) / fps / 60,
+            "data": np.clip(50 + np.cumsum(rng.normal(0, 0.3, frames)), 0, 100).astype(np.float32),
+        },
+        "pie_chart1": {"labels": ["Left", "Right", "Center"], "data": [10.0, 15.0, 75.0]},
+        "pie_chart2": {"labels": ["Forward", "Looking Down"], "data": [90.0, 10.0]},
+        "pie_chart3": {"labels": ["Front Camera", "Not Front Camera"], "data": [95.0, 5.0]},
+    }
+    scores = {"final": "72.46%", "highest_continuous": "80.00%", "min": "50.00%", "after_quiz": "72.46%"}
+    table_data = [{"question": f"Question {i}?", "status": "Correct", "score": "100%"} for i in range(5)]
+    return chart_data, scores, table_data
+
+
+def time_render(inputs, max_points, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        report = hi.generate_html_from_template(TEMPLATE_PATH, *inputs, max_points=max_points)
+    return (time.perf_counter() - start) / repeat, len(report.encode("utf-8"))
+
+
+def main():
+    start = time.perf_counter()
+    hi.get_compiled_template(TEMPLATE_PATH)
+    print(f"template compile (once): {(time.perf_counter() - start) * 1000:.1f} ms")
+    for minutes, fps in ((10, 5), (60, 5), (60, 30)):
+        inputs = report_inputs(minutes, fps)
+        for name, max_points in ((f"{config.REPORT_MAX_POINTS} points", config.REPORT_MAX_POINTS), ("every frame", 0)):
+            seconds, size = time_render(inputs, max_points)
+            print(f"{minutes:3d} min @ {fps:2d} fps, {name:<12} {seconds * 1000:8.1f} ms  {size / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2 as cv
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import focus_detection as fd
+from constants import *
+from constants import config
+from scoring import score_signals
+import synthetic_video
+
+# Accuracy against speed of the offline analysis path: every sampled frame of a video is
+# analysed by analyze_frame at full resolution with every pose solved from scratch (the
+# reference) and by analyze_frame_offline at each inference width, each with its own
+# FaceMesh and head pose estimator as in analyze_segment, and the resulting focus series
+# are compared with the reference's.
+#
+#   python benchmarks/offline_accuracy.py lecture.mp4 --widths 1280 960 640 480
+#
+# Without videos, a synthetic 1080p recording is used.
+
+VIDEO_DIR = os.path.join(tempfile.gettempdir(), "focus_analyzer_benchmark_videos")
+
+
+def analyze_video(video_path, widths, analysis_fps):
+    # {setting: (signal columns, seconds spent analysing)}; setting None is the reference
+    cap = cv.VideoCapture(video_path)
+    stride = fd.analysis_stride(cap.get(cv.CAP_PROP_FPS), analysis_fps)
+    settings = [None] + list(widths)
+    meshes = {setting: fd.create_face_mesh() for setting in settings}
+    head_poses = {setting: fd.HeadPoseEstimator() for setting in settings}
+    columns = {setting: {'timestamp': [], 'eye_direction': [], 'face_position': [], 'blink_ratio': [], 'pitch': [], 'yaw': []}
+               for setting in settings}
+    elapsed = dict.fromkeys(settings, 0.0)
+
+    for timestamp, frame in fd.sampled_frames(cap, 0, None, stride):
+        for setting in settings:
+            start = time.perf_counter()
+            if setting is None:
+                _, signals = fd.analyze_frame(frame, meshes[setting])
+            else:
+                signals = fd.analyze_frame_offline(frame, meshes[setting], setting, head_poses[setting])
+            elapsed[setting] += time.perf_counter() - start
+
+            row = columns[setting]
+            row['timestamp'].append(timestamp)
+            row['eye_direction'].append(EYE_DIRECTION_CODES[signals.eye_direction])
+            row['face_position'].append(FACE_POSITION_CODES[signals.face_position])
+            row['blink_ratio'].append(signals.blink_ratio)
+            row['pitch'].append(signals.pitch)
+            row['yaw'].append(signals.yaw)
+    cap.release()
+    for face_mesh in meshes.values():
+        face_mesh.close()
+
+    return {setting: ({name: np.array(values) for name, values in columns[setting].items()}, elapsed[setting])
+            for setting in settings}
+
+
+def focus_series(signals):
+    return score_signals(signals['timestamp'], signals['face_position'], signals['eye_direction'], signals['blink_ratio'])
+
+
+def report(video_path, results):
+    reference, reference_seconds = results[None]
+    reference_scores = focus_series(reference)
+    frames = len(reference['timestamp'])
+    detected = reference['face_position'] != FACE_POSITION_CODES["Not Detected"]
+    print(f"{video_path}: {frames} frames, face in {detected.mean():.0%}, "
+          f"reference {reference_seconds / frames * 1000:.1f} ms/frame, mean focus {reference_scores.mean():.2f}")
+    print(f"{'width':>8} {'ms/frame':>9} {'speedup':>8} {'face':>7} {'eyes':>7} {'detect':>7} "
+          f"{'|d pose|':>9} {'|d score|':>10} {'max':>6} {'d mean':>7}")
+    for setting, (signals, seconds) in results.items():
+        if setting is None:
+            continue
+        scores = focus_series(signals)
+        both = detected & (signals['face_position'] != FACE_POSITION_CODES["Not Detected"])
+        pose_error = np.abs(np.concatenate([signals['pitch'][both] - reference['pitch'][both],
+                                            signals['yaw'][both] - reference['yaw'][both]]))
+        score_error = np.abs(scores - reference_scores)
+        print(f"{setting or 'full':>8} {seconds / frames * 1000:9.1f} {reference_seconds / seconds:7.2f}x "
+              f"{(signals['face_position'] == reference['face_position']).mean():7.1%} "
+              f"{(signals['eye_direction'] == reference['eye_direction']).mean():7.1%} "
+              f"{((signals['face_position'] != FACE_POSITION_CODES['Not Detected']) == detected).mean():7.1%} "
+              f"{pose_error.mean() if len(pose_error) else float('nan'):9.2f} {score_error.mean():10.2f} "
+              f"{score_error.max():6.1f} {scores.mean() - reference_scores.mean():+7.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare offline analysis at reduced resolution with full resolution.")
+    parser.add_argument("videos", nargs="*", help="Videos to compare on (default: a synthetic 1080p video)")
+    parser.add_argument("--widths", nargs="+", type=int, default=[0, 1280, 960, 640, 480],
+                        help="Inference widths to compare; 0 analyses at full resolution (no downscale)")
+    parser.add_argument("--analysis-fps", type=float, default=config.ANALYSIS_FPS, help="Frames per second analysed")
+    args = parser.parse_args(argv)
+
+    videos = args.videos or [synthetic_video.cached_video(VIDEO_DIR, 1920, 1080, 60, face_ratio=0.7)]
+    print("face/eyes/detect: share of frames with the reference's label; |d pose|: mean pitch/yaw difference;\n"
+          "|d score|, max: focus score difference per frame; d mean: difference of the average focus score\n")
+    for video_path in videos:
+        report(video_path, analyze_video(video_path, args.widths, args.analysis_fps))
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2 as cv
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, ".."))
+import focus_detection as fd
+import html_integration as hi
+from constants import config
+from scoring import FocusScorer
+from session_summary import SessionSummary
+import synthetic_video
+
+# Benchmark suite for the analysis hot paths, on synthetic videos written locally with
+# cv.VideoWriter. Every case runs --runs times, each in a fresh process, and reports its
+# median throughput in frames per second and the largest peak resident memory; results
+# are compared with the stored baselines and the run fails when a case is slower or
+# bigger than allowed.
+#
+#   python benchmarks/run_benchmarks.py                     # compare with baselines.json
+#   python benchmarks/run_benchmarks.py --quick             # shorter videos, fewer frames
+#   python benchmarks/run_benchmarks.py --update-baselines  # record this machine's numbers
+#
+# Baselines are only meaningful on the machine they were recorded on; the file keeps a
+# description of that machine and the run warns when it differs.
+
+BASELINES_PATH = os.path.join(BENCHMARK_DIR, "baselines.json")
+VIDEO_DIR = os.path.join(tempfile.gettempdir(), "focus_analyzer_benchmark_videos")
+TEMPLATE_PATH = os.path.join(BENCHMARK_DIR, "..", "templates", "index.html")
+SPEED_THRESHOLD = 0.25  # Allowed drop in frames/sec before a case counts as a regression
+MEMORY_THRESHOLD = 0.20  # Allowed growth in peak memory
+
+
+def peak_memory_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # ru_maxrss is in KiB on Linux
+
+
+def bench_process_frame(width, height, face_ratio, frames, drift=1.0):
+    # process_frame on decoded frames as the live worker runs it: motion gate, FaceMesh,
+    # pose, eyes, scoring and overlay; decoding is not timed, and each frame is dropped
+    # once processed
+    path = synthetic_video.cached_video(VIDEO_DIR, width, height, 10, face_ratio=face_ratio, drift=drift)
+    cap = cv.VideoCapture(path)
+    scorer = FocusScorer()
+    head_pose = fd.HeadPoseEstimator()
+    motion_gate = fd.MotionGate()
+    elapsed = 0.0
+    processed = 0
+    with fd.create_face_mesh() as face_mesh:
+        ret, frame = cap.read()
+        fd.process_frame(frame, face_mesh, scorer, 0.0, head_pose, motion_gate)
+        while processed < frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            start = time.perf_counter()
+            fd.process_frame(frame, face_mesh, scorer, (processed + 1) / 30, head_pose, motion_gate)
+            elapsed += time.perf_counter() - start
+            processed += 1
+    cap.release()
+    return processed / elapsed
+
+
+def bench_uploaded_video(width, height, seconds, face_ratio, drift=1.0):
+    # End to end on one process: decode, analysis at ANALYSIS_FPS, scoring and the DataFrame
+    path = synthetic_video.cached_video(VIDEO_DIR, width, height, seconds, face_ratio=face_ratio, drift=drift)
+    start = time.perf_counter()
+    df = fd.process_uploaded_video(path, workers=1)
+    return len(df) / (time.perf_counter() - start)
+
+
+def synthetic_results(minutes, fps):
+    frames = int(minutes * 60 * fps)
+    rng = np.random.default_rng(0)
+    timestamps = np.arange(frames) / fps
+    eye_codes = rng.integers(0, 5, frames).astype(np.int8)
+    face_codes = rng.integers(0, 6, frames).astype(np.int8)
+    scores = np.clip(50 + np.cumsum(rng.normal(0, 0.3, frames)), 0, 100).astype(np.float32)
+    return timestamps, eye_codes, face_codes, scores
+
+
+def bench_aggregation(minutes, fps, repeat=20):
+    # Report statistics of a finished analysis: summary, chart data and score cards
+    timestamps, eye_codes, face_codes, scores = synthetic_results(minutes, fps)
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        summary = SessionSummary()
+        summary.update_many(timestamps, eye_codes, face_codes, scores)
+        summary.chart_data(timestamps / 60, scores)
+        summary.scores(summary.mean_score)
+        durations.append(time.perf_counter() - start)
+    return len(timestamps) / np.median(durations)
+
+
+def bench_report(minutes, fps, repeat=20):
+    # generate_html_from_template with the configured point budget
+    timestamps, eye_codes, face_codes, scores = synthetic_results(minutes, fps)
+    summary = SessionSummary()
+    summary.update_many(timestamps, eye_codes, face_codes, scores)
+    chart_data = summary.chart_data(timestamps / 60, scores)
+    card_scores = summary.scores(summary.mean_score)
+    hi.get_compiled_template(TEMPLATE_PATH)
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hi.generate_html_from_template(TEMPLATE_PATH, chart_data, card_scores, [])
+        durations.append(time.perf_counter() - start)
+    return len(timestamps) / np.median(durations)
+
+
+def cases(quick):
+    frames = 60 if quick else 200
+    seconds = 20 if quick else 60
+    return {
+        "process_frame_480p_face": (bench_process_frame, (640, 480, 1.0, frames)),
+        "process_frame_720p_face": (bench_process_frame, (1280, 720, 1.0, frames)),
+        "process_frame_1080p_face": (bench_process_frame, (1920, 1080, 1.0, frames)),
+        "process_frame_720p_empty": (bench_process_frame, (1280, 720, 0.0, frames)),
+        "process_frame_720p_still": (bench_process_frame, (1280, 720, 1.0, frames, 0.0)),
+        f"uploaded_video_720p_{seconds}s_mixed": (bench_uploaded_video, (1280, 720, seconds, 0.7)),
+        f"uploaded_video_720p_{seconds}s_still": (bench_uploaded_video, (1280, 720, seconds, 0.7, 0.0)),
+        "aggregation_60min_30fps": (bench_aggregation, (60, 30)),
+        "report_60min_30fps": (bench_report, (60, 30)),
+    }
+
+
+def run_case(function, args):
+    # Runs in a fresh process, so peak memory belongs to this case alone
+    config.SIGNAL_CACHE_MAX_BYTES = 0
+    frames_per_sec = function(*args)
+    return {"frames_per_sec": float(frames_per_sec), "peak_memory_mb": peak_memory_mb()}
+
+
+def machine():
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "opencv": cv.__version__,
+        "mediapipe": fd.mp.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def compare(name, result, baseline, speed_threshold, memory_threshold):
+    # Regression messages for one case, empty when it is within the thresholds
+    problems = []
+    if result["frames_per_sec"] < baseline["frames_per_sec"] * (1 - speed_threshold):
+        problems.append(f"{name}: {result['frames_per_sec']:.1f} frames/sec, baseline {baseline['frames_per_sec']:.1f}")
+    if result["peak_memory_mb"] > baseline["peak_memory_mb"] * (1 + memory_threshold):
+        problems.append(f"{name}: {result['peak_memory_mb']:.0f} MiB peak, baseline {baseline['peak_memory_mb']:.0f}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis hot paths on synthetic videos.")
+    parser.add_argument("--quick", action="store_true", help="Shorter videos and fewer frames")
+    parser.add_argument("--only", nargs="+", metavar="CASE", help="Run only these cases")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per case; the median is kept")
+    parser.add_argument("--baselines", default=BASELINES_PATH, help="Baselines JSON file")
+    parser.add_argument("--update-baselines", action="store_true", help="Store this run as the baselines")
+    parser.add_argument("--speed-threshold", type=float, help=f"Allowed frames/sec drop (default {SPEED_THRESHOLD})")
+    parser.add_argument("--memory-threshold", type=float, help=f"Allowed peak memory growth (default {MEMORY_THRESHOLD})")
+    args = parser.parse_args(argv)
+
+    stored = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, encoding="utf-8") as f:
+            stored = json.load(f)
+    thresholds = stored.get("thresholds", {})
+    speed_threshold = args.speed_threshold if args.speed_threshold is not None else thresholds.get("speed", SPEED_THRESHOLD)
+    memory_threshold = args.memory_threshold if args.memory_threshold is not None else thresholds.get("memory", MEMORY_THRESHOLD)
+    baselines = stored.get("cases", {})
+    if baselines and stored.get("machine") != machine() and not args.update_baselines:
+        print("warning: baselines were recorded on a different machine or library versions")
+
+    # Videos are written on first use, before a case starts timing, and kept for later runs
+    selected = {name: case for name, case in cases(args.quick).items() if not args.only or name in args.only}
+    results = {}
+    problems = []
+    context = multiprocessing.get_context("spawn")
+    print(f"{'case':<34} {'frames/sec':>11} {'baseline':>9} {'peak MiB':>9} {'baseline':>9}")
+    for name, (function, case_args) in selected.items():
+        runs = []
+        for _ in range(args.runs):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                runs.append(executor.submit(run_case, function, case_args).result())
+        result = {
+            "frames_per_sec": float(np.median([run["frames_per_sec"] for run in runs])),
+            "peak_memory_mb": max(run["peak_memory_mb"] for run in runs),
+        }
+        results[name] = result
+        baseline = baselines.get(name)
+        print(f"{name:<34} {result['frames_per_sec']:11.5g} "
+              f"{baseline['frames_per_sec'] if baseline else float('nan'):9.5g} "
+              f"{result['peak_memory_mb']:9.0f} {baseline['peak_memory_mb'] if baseline else float('nan'):9.0f}")
+        if baseline and not args.update_baselines:
+            problems += compare(name, result, baseline, speed_threshold, memory_threshold)
+
+    if args.update_baselines:
+        stored = {
+            "machine": machine(),
+            "thresholds": {"speed": speed_threshold, "memory": memory_threshold},
+            "cases": dict(baselines, **{name: {key: round(value, 1) for key, value in result.items()}
+                                        for name, result in results.items()}),
+        }
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=2)
+            f.write("\n")
+        print(f"baselines written to {args.baselines}")
+        return 0
+
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
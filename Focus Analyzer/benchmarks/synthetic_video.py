@@ -0,0 +1,77 @@
+import os
+
+import cv2 as cv
+import numpy as np
+
+# Test videos drawn with OpenCV primitives, so benchmarks need no recorded footage. The
+# cartoon face is simple but FaceMesh tracks it; it drifts around the frame, looks left,
+# right and ahead and blinks, and disappears for whole seconds at a time so a video can
+# mix frames with and without a face.
+
+BACKGROUND = (90, 80, 70)
+SKIN = (140, 170, 215)
+HAIR = (30, 30, 50)
+
+
+def draw_face(frame, cx, cy, size, gaze=0.0, eyes_open=True):
+    # Head and shoulders centred on (cx, cy), `size` pixels from chin to crown
+    s = size
+    cv.ellipse(frame, (cx, cy + int(1.25 * s)), (int(1.3 * s), int(0.6 * s)), 0, 180, 360, (60, 60, 150), -1)
+    cv.rectangle(frame, (cx - int(0.25 * s), cy + int(0.5 * s)), (cx + int(0.25 * s), cy + int(0.9 * s)), SKIN, -1)
+    cv.ellipse(frame, (cx, cy), (int(0.55 * s), int(0.72 * s)), 0, 0, 360, SKIN, -1)
+    cv.ellipse(frame, (cx, cy - int(0.45 * s)), (int(0.6 * s), int(0.4 * s)), 0, 180, 360, HAIR, -1)
+    for side in (-1, 1):
+        ex, ey = cx + side * int(0.22 * s), cy - int(0.1 * s)
+        if eyes_open:
+            iris = (ex + int(gaze * 0.06 * s), ey)
+            cv.ellipse(frame, (ex, ey), (int(0.11 * s), int(0.055 * s)), 0, 0, 360, (245, 245, 245), -1)
+            cv.circle(frame, iris, int(0.045 * s), (50, 35, 25), -1)
+            cv.circle(frame, iris, int(0.02 * s), (0, 0, 0), -1)
+        else:
+            cv.line(frame, (ex - int(0.11 * s), ey), (ex + int(0.11 * s), ey), (60, 60, 90), max(1, int(0.015 * s)))
+        cv.line(frame, (ex - int(0.12 * s), ey - int(0.12 * s)), (ex + int(0.12 * s), ey - int(0.14 * s)), HAIR, max(2, int(0.03 * s)))
+    nose = np.array([[cx, cy - int(0.05 * s)], [cx - int(0.07 * s), cy + int(0.17 * s)], [cx + int(0.07 * s), cy + int(0.17 * s)]])
+    cv.polylines(frame, [nose], False, (100, 120, 170), max(1, int(0.02 * s)))
+    cv.ellipse(frame, (cx, cy + int(0.33 * s)), (int(0.15 * s), int(0.05 * s)), 0, 0, 360, (90, 90, 170), -1)
+    return frame
+
+
+def synthetic_frames(width, height, seconds, fps=30, face_ratio=1.0, seed=0, drift=1.0):
+    # Yield the frames of a video; each second has a face with probability `face_ratio`.
+    # `drift` scales how far the face wanders, 0 for a viewer who sits perfectly still.
+    rng = np.random.default_rng(seed)
+    with_face = rng.random(int(np.ceil(seconds))) < face_ratio
+    gazes = rng.choice([-1.0, 0.0, 1.0], size=len(with_face) // 2 + 1)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    for index in range(int(seconds * fps)):
+        t = index / fps
+        frame[:] = BACKGROUND
+        if with_face[int(t)]:
+            cx = int(width / 2 + drift * 0.08 * width * np.sin(2 * np.pi * t / 7))
+            cy = int(height / 2 + drift * 0.03 * height * np.sin(2 * np.pi * t / 5))
+            eyes_open = index % (4 * fps) >= 3  # Three closed-eye frames every four seconds
+            draw_face(frame, cx, cy, int(0.33 * height), gazes[int(t) // 2], eyes_open)
+        yield frame
+
+
+def write_video(path, width, height, seconds, fps=30, face_ratio=1.0, seed=0, drift=1.0):
+    writer = cv.VideoWriter(path, cv.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"cannot write {path}")
+    for frame in synthetic_frames(width, height, seconds, fps, face_ratio, seed, drift):
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def cached_video(directory, width, height, seconds, fps=30, face_ratio=1.0, seed=0, drift=1.0):
+    # Path of the video with these parameters, written on first use
+    os.makedirs(directory, exist_ok=True)
+    name = f"{width}x{height}_{seconds}s_{fps}fps_face{round(face_ratio * 100)}_seed{seed}"
+    if drift != 1.0:
+        name += f"_drift{round(drift * 100)}"
+    path = os.path.join(directory, name + ".mp4")
+    if not os.path.exists(path):
+        write_video(path + ".partial.mp4", width, height, seconds, fps, face_ratio, seed, drift)
+        os.replace(path + ".partial.mp4", path)
+    return path
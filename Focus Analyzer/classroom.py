@@ -0,0 +1,309 @@
+import cv2 as cv
+import numpy as np
+import pandas as pd
+
+import focus_detection as fd
+from constants import *
+from constants import config
+from frame_buffer import ColumnBuffer
+from head_pose import solve_head_pose, rotation_angles
+from scoring import SCORE_STEP, ABSENT, CENTERED, CLOSED, signal_states
+
+# Classroom mode: one camera covering a room, every visible face scored as its own student.
+# Faces are analysed together in one batched pass per frame and scoring state is held in
+# arrays with one entry per student, so the per-frame cost is mostly fixed overhead.
+
+# Per-student rows of the classroom time series; labels are stored as category codes
+CLASSROOM_COLUMNS = {
+    'timestamp': np.float64,
+    'student': np.int32,
+    'focus_score': np.float32,
+    'eye_direction': np.int8,
+    'face_position': np.int8,
+    'blink_ratio': np.float32,
+    'pitch': np.float32,
+    'yaw': np.float32,
+    'x': np.float32,  # Face centre, as a fraction of the frame width and height
+    'y': np.float32,
+}
+
+
+def create_classroom_face_mesh(max_faces=None):
+    return fd.mp_face_mesh.FaceMesh(**dict(fd.FACE_MESH_SETTINGS, max_num_faces=max_faces or config.CLASSROOM_MAX_FACES))
+
+
+def landmark_stack(frame, results):
+    # Landmarks of every face as one (F, N, 3) array: x and y in pixels, z as given by FaceMesh
+    points = np.stack([fd.landmark_array(face) for face in results.multi_face_landmarks])
+    points[..., 0] *= frame.shape[1]
+    points[..., 1] *= frame.shape[0]
+    return points
+
+
+def analyze_faces(points, frame_width, frame_height):
+    # Signals of all faces in a frame at once, the same ones analyze_frame gives for a
+    # single face: (eye_direction codes, face_position codes, blink ratios, pitch, yaw)
+    mesh_points = points[..., :2].astype(np.int32)
+
+    # Head pose of every face from one batched least-squares solve
+    face_2d = mesh_points[:, fd.POSE_LANDMARKS].astype(np.float64)
+    face_3d = np.concatenate([face_2d, points[:, fd.POSE_LANDMARKS, 2:]], axis=-1)
+    angles = rotation_angles(solve_head_pose(face_3d, face_2d, frame_width, frame_height)) * 360
+    pitch, yaw = angles[:, 0], angles[:, 1]
+    face_position = fd.face_position_codes(pitch, yaw)
+
+    # Blink ratio: rows of the distance arrays are (right eye, left eye)
+    h_segments = mesh_points[:, fd.EYE_HORIZONTAL]
+    v_segments = mesh_points[:, fd.EYE_VERTICAL]
+    h_delta = h_segments[:, :, 1] - h_segments[:, :, 0]
+    v_delta = v_segments[:, :, 1] - v_segments[:, :, 0]
+    h_distance = np.hypot(h_delta[..., 0], h_delta[..., 1])
+    v_distance = np.hypot(v_delta[..., 0], v_delta[..., 1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = h_distance / v_distance
+    ratio = np.where((v_distance == 0).any(axis=1), np.inf, (ratios[:, 0] + ratios[:, 1]) / 2)
+
+    # Iris centres (minEnclosingCircle has no batched form, but it is cheap)
+    irises = np.ascontiguousarray(mesh_points[:, LEFT_IRIS + RIGHT_IRIS]).reshape(-1, 4, 2)
+    iris_x = np.array([int(cv.minEnclosingCircle(iris)[0][0]) for iris in irises]).reshape(-1, 2)
+    left_iris_x, right_iris_x = iris_x[:, 0], iris_x[:, 1]
+    left_eye = fd.eye_direction_codes(mesh_points[:, LEFT_EYE, 0], left_iris_x, ratio)
+    right_eye = fd.eye_direction_codes(mesh_points[:, RIGHT_EYE, 0], right_iris_x, ratio)
+    eye_direction = fd.both_eyes_code(left_eye, right_eye)
+
+    return eye_direction, face_position, ratio, pitch, yaw
+
+
+class FaceTracker:
+    # Keeps a student id on each face across frames by matching face centres to the
+    # nearest tracked centre, closest pairs first. A face further than
+    # CLASSROOM_MATCH_DISTANCE face widths from every free track starts a new student;
+    # tracks unseen for CLASSROOM_TRACK_TIMEOUT seconds are retired. Tracks live in slots,
+    # and a retired track's slot goes to the next new student, so per-track arrays only
+    # grow to the most students tracked at once. Student ids are never reused.
+    def __init__(self):
+        self.centres = np.empty((0, 2))
+        self.last_seen = np.empty(0)
+        self.active = np.empty(0, dtype=bool)
+        self.students = np.empty(0, dtype=np.int64)  # Student id of each slot
+        self.next_student = 0
+        self.opened = np.empty(0, dtype=np.intp)  # Slots given to new students by the last assign()
+
+    def assign(self, centres, widths, timestamp):
+        # The slot of each face
+        self.active &= timestamp - self.last_seen <= config.CLASSROOM_TRACK_TIMEOUT
+        tracks = np.flatnonzero(self.active)
+        slots = np.full(len(centres), -1)
+
+        if len(tracks) and len(centres):
+            distances = np.linalg.norm(self.centres[tracks, None] - centres[None], axis=-1)
+            distances[distances > config.CLASSROOM_MATCH_DISTANCE * widths[None]] = np.inf
+            taken = np.zeros(len(tracks), dtype=bool)
+            for pair in np.argsort(distances, axis=None):
+                track, face = divmod(int(pair), len(centres))
+                if distances[track, face] == np.inf:
+                    break
+                if not taken[track] and slots[face] < 0:
+                    taken[track] = True
+                    slots[face] = tracks[track]
+
+        new_faces = np.flatnonzero(slots < 0)
+        free = np.flatnonzero(~self.active)[:len(new_faces)]
+        grow = len(new_faces) - len(free)
+        if grow > 0:
+            free = np.concatenate([free, len(self.active) + np.arange(grow)])
+            self.centres = np.concatenate([self.centres, np.zeros((grow, 2))])
+            self.last_seen = np.concatenate([self.last_seen, np.zeros(grow)])
+            self.active = np.concatenate([self.active, np.zeros(grow, dtype=bool)])
+            self.students = np.concatenate([self.students, np.full(grow, -1)])
+        slots[new_faces] = free
+        self.active[free] = True
+        self.students[free] = self.next_student + np.arange(len(free))
+        self.next_student += len(free)
+        self.opened = free
+
+        self.centres[slots] = centres
+        self.last_seen[slots] = timestamp
+        return slots
+
+
+def _due_steps(current_time, last_step_time, frame_span):
+    # Vectorized scoring._due_steps; NaN stands for "never"
+    with np.errstate(invalid='ignore'):
+        elapsed = current_time - last_step_time
+        steps = np.maximum(1, np.minimum(np.floor(elapsed / SCORE_STEP + 1e-6), np.floor(frame_span / SCORE_STEP + 1e-6)))
+        steps = np.where(elapsed < SCORE_STEP - 1e-6, 0, steps)
+    return np.where(np.isnan(last_step_time), 1, steps)
+
+
+class ClassroomScorer:
+    # FocusScorer for many students at once: every timer is an array with one entry per
+    # student (NaN where FocusScorer holds None) and each frame updates them with masks,
+    # so scoring a frame costs the same few array operations for any class size.
+    def __init__(self, focus_score=50):
+        self.initial_score = focus_score
+        self.focus_score = np.empty(0)
+        self.last_look_centered_time = np.empty(0)
+        self.not_looking_start_time = np.empty(0)
+        self.blink_start_time = np.empty(0)
+        self.blink_detected = np.empty(0, dtype=bool)
+        self.last_focus_increase_time = np.empty(0)
+        self.last_focus_decrease_time = np.empty(0)
+        self.previous_time = np.empty(0)
+
+    def _grow(self, students):
+        new = students - len(self.focus_score)
+        if new <= 0:
+            return
+        nan = np.full(new, np.nan)
+        self.focus_score = np.concatenate([self.focus_score, np.full(new, float(self.initial_score))])
+        for name in ('last_look_centered_time', 'not_looking_start_time', 'blink_start_time',
+                     'last_focus_increase_time', 'last_focus_decrease_time', 'previous_time'):
+            setattr(self, name, np.concatenate([getattr(self, name), nan]))
+        self.blink_detected = np.concatenate([self.blink_detected, np.zeros(new, dtype=bool)])
+
+    def reset(self, students):
+        # Start the given students over, as when a retired student's slot is reused
+        if not len(students):
+            return
+        self._grow(int(students.max()) + 1)
+        self.focus_score[students] = self.initial_score
+        for name in ('last_look_centered_time', 'not_looking_start_time', 'blink_start_time',
+                     'last_focus_increase_time', 'last_focus_decrease_time', 'previous_time'):
+            getattr(self, name)[students] = np.nan
+        self.blink_detected[students] = False
+
+    def update(self, current_time, states, scored):
+        # states: one scoring state (ABSENT, CENTERED or AWAY, plus CLOSED) per student;
+        # only students in the `scored` mask are updated. Returns every student's score.
+        self._grow(len(states))
+        t = current_time
+        frame_span = np.where(np.isnan(self.previous_time), SCORE_STEP, t - self.previous_time)
+        self.previous_time = np.where(scored, t, self.previous_time)
+
+        # No face: lose 0.5 per step, leave every other timer alone
+        absent = scored & (states == ABSENT)
+        steps = _due_steps(t, self.last_focus_decrease_time, frame_span)
+        apply = absent & (steps > 0)
+        self.focus_score = np.where(apply, np.maximum(0, self.focus_score - 0.5 * steps), self.focus_score)
+        self.last_focus_decrease_time = np.where(apply, t, self.last_focus_decrease_time)
+
+        present = scored & ~absent
+        centered = present & (states & CENTERED > 0)
+        away = present & ~centered
+        with np.errstate(invalid='ignore'):
+            # Looking at the screen: gain 0.3 per step after CENTER_THRESHOLD
+            self.last_look_centered_time = np.where(centered & np.isnan(self.last_look_centered_time), t,
+                                                    np.where(away, np.nan, self.last_look_centered_time))
+            steps = _due_steps(t, self.last_focus_increase_time, frame_span)
+            apply = centered & (t - self.last_look_centered_time >= config.CENTER_THRESHOLD) & (steps > 0)
+            self.focus_score = np.where(apply, np.minimum(100, self.focus_score + 0.3 * steps), self.focus_score)
+            self.last_focus_increase_time = np.where(apply, t, self.last_focus_increase_time)
+
+            # Looking away: lose DISCOUNT_SIDE per step after SIDE_THRESHOLD
+            looking_since = self.not_looking_start_time
+            steps = _due_steps(t, self.last_focus_decrease_time, frame_span)
+            apply = away & ~np.isnan(looking_since) & (t - looking_since >= config.SIDE_THRESHOLD) & (steps > 0)
+            self.not_looking_start_time = np.where(away & np.isnan(looking_since), t,
+                                                   np.where(centered, np.nan, looking_since))
+            self.focus_score = np.where(apply, np.maximum(0, self.focus_score - config.DISCOUNT_SIDE * steps), self.focus_score)
+            self.last_focus_decrease_time = np.where(apply, t, self.last_focus_decrease_time)
+
+            # Eyes closed: lose DISCOUNT_EYES every BLINK_THRESHOLD seconds
+            closed = present & (states & CLOSED > 0)
+            starting = closed & ~self.blink_detected
+            apply = (closed & self.blink_detected & (t - self.blink_start_time >= config.BLINK_THRESHOLD)
+                     & (np.isnan(self.last_focus_decrease_time) | (t - self.last_focus_decrease_time >= SCORE_STEP - 1e-6)))
+            self.focus_score = np.where(apply, np.maximum(0, self.focus_score - config.DISCOUNT_EYES), self.focus_score)
+            self.blink_start_time = np.where(starting | apply, t, self.blink_start_time)
+            self.blink_detected = np.where(present, closed, self.blink_detected)
+
+        return self.focus_score
+
+
+class ClassroomAnalyzer:
+    # Tracking and scoring state of one classroom recording. update() takes the FaceMesh
+    # results of a frame and returns the student ids on screen or still tracked, with
+    # their CLASSROOM_COLUMNS values for this frame (timestamp and student excluded).
+    def __init__(self):
+        self.tracker = FaceTracker()
+        self.scorer = ClassroomScorer()
+
+    def update(self, frame, results, timestamp):
+        height, width = frame.shape[:2]
+        if results.multi_face_landmarks:
+            points = landmark_stack(frame, results)
+            eye_codes, face_codes, ratio, pitch, yaw = analyze_faces(points, width, height)
+            centres = points[..., :2].mean(axis=1) / (width, height)
+            widths = np.ptp(points[..., 0], axis=1) / width
+            slots = self.tracker.assign(centres, widths, timestamp)
+        else:
+            slots = self.tracker.assign(np.empty((0, 2)), np.empty(0), timestamp)
+
+        # Students tracked but not seen in this frame are scored as not detected
+        count = len(self.tracker.active)
+        states = np.full(count, ABSENT)
+        eye_direction = np.full(count, EYE_DIRECTION_CODES["Not Detected"], dtype=np.int8)
+        face_position = np.full(count, FACE_POSITION_CODES["Not Detected"], dtype=np.int8)
+        blink_ratio, pitch_column, yaw_column, x, y = (np.full(count, np.nan) for _ in range(5))
+        if len(slots):
+            states[slots] = signal_states(face_codes, eye_codes, ratio)
+            eye_direction[slots], face_position[slots] = eye_codes, face_codes
+            blink_ratio[slots], pitch_column[slots], yaw_column[slots] = ratio, pitch, yaw
+            x[slots], y[slots] = centres[:, 0], centres[:, 1]
+
+        scored = self.tracker.active
+        self.scorer.reset(self.tracker.opened)
+        focus_score = self.scorer.update(timestamp, states, scored)
+        slots = np.flatnonzero(scored)
+        slots = slots[np.argsort(self.tracker.students[slots])]
+        return self.tracker.students[slots], tuple(column[slots] for column in (focus_score, eye_direction, face_position, blink_ratio, pitch_column, yaw_column, x, y))
+
+
+def process_classroom_video(video_path, analysis_fps=None, progress=None):
+    # Per-student focus time series of a classroom video: one row per analysed frame and
+    # tracked student, long format (pivot on 'student' for one column per student)
+    cap = cv.VideoCapture(video_path)
+    video_fps = cap.get(cv.CAP_PROP_FPS)
+    frame_count = int(cap.get(cv.CAP_PROP_FRAME_COUNT))
+    stride = fd.analysis_stride(video_fps, analysis_fps)
+    frames_done = 0
+
+    def count_frames(frames):
+        nonlocal frames_done
+        frames_done += frames
+        if frame_count > 0:
+            progress(min(1.0, frames_done / frame_count))
+
+    rows = ColumnBuffer(CLASSROOM_COLUMNS)
+    analyzer = ClassroomAnalyzer()
+    frames_analysed = 0
+    with create_classroom_face_mesh() as face_mesh:
+        for timestamp, frame in fd.sampled_frames(cap, 0, None, stride, count_frames if progress else None):
+            frames_analysed += 1
+            frame = cv.flip(frame, 1)
+            results = face_mesh.process(cv.cvtColor(frame, cv.COLOR_BGR2RGB))
+            students, values = analyzer.update(frame, results, timestamp)
+            if len(students):
+                rows.extend(timestamp, students, *values)
+    cap.release()
+
+    columns = rows.arrays()
+    df = pd.DataFrame(columns)
+    df['eye_direction'] = pd.Categorical.from_codes(columns['eye_direction'], categories=EYE_DIRECTIONS)
+    df['face_position'] = pd.Categorical.from_codes(columns['face_position'], categories=FACE_POSITIONS)
+    start_time = columns['timestamp'][0] if len(df) else 0
+    df['timestamp_min'] = (df['timestamp'] - start_time) / 60
+    df.attrs['frames_analysed'] = frames_analysed
+    return df
+
+
+def student_summary(df):
+    # One row per student of a process_classroom_video result
+    return df.groupby('student').agg(
+        first_seen=('timestamp', 'min'),
+        last_seen=('timestamp', 'max'),
+        frames=('focus_score', 'size'),
+        mean_focus_score=('focus_score', 'mean'),
+        final_focus_score=('focus_score', 'last'),
+    )
@@ -1,3 +1,5 @@
+import os
+import tempfile
 import cv2 as cv
 
 # =========================
@@ -19,6 +21,39 @@ class Config:
         self.DISCOUNT_CENTER = 0.3
         self.DISCOUNT_SIDE = 0.3
         self.DISCOUNT_EYES = 0.5
+        self.ANALYSIS_FPS = 5  # Frames per second analysed in uploaded videos; the rest are skipped
+        self.INFERENCE_WIDTH = 640  # Uploaded videos wider than this are analysed on a downscaled copy; 0 keeps full size
+        self.ANALYSIS_WORKERS = os.cpu_count() or 1  # Processes sharing the analysis of an uploaded video
+        self.LIVE_LATENCY_BUDGET = 0.03  # Seconds a live frame may wait for its own analysis before it is sent on
+        # Processes analysing live streams, shared by all sessions; 0 analyses them in the server process
+        self.LIVE_WORKERS = int(os.environ.get("LIVE_WORKERS", os.cpu_count() or 1))
+        self.LIVE_WORKER_TIMEOUT = 30  # Seconds a live frame may take in a worker, including its start-up
+        # Motion gate: frames where nothing in view moved reuse the last analysed frame's signals
+        self.MOTION_GATE_ENABLED = True
+        self.MOTION_PIXEL_DELTA = 12  # Grey levels a thumbnail pixel must change by to count as moved
+        self.MOTION_CHANGED_FRACTION = 0.01  # Share of moved thumbnail pixels above which a frame is analysed
+        self.MOTION_MAX_REUSE = 2.0  # Seconds after which FaceMesh runs again however still the view is
+        self.WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "base")
+        self.WHISPER_WARMUP = os.environ.get("WHISPER_WARMUP", "0") == "1"  # Load Whisper when the server starts
+        # On-disk cache of per-frame signals shared by every session; a size of 0 disables it
+        self.SIGNAL_CACHE_DIR = os.environ.get("SIGNAL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "focus_analyzer_signals"))
+        self.SIGNAL_CACHE_MAX_BYTES = int(os.environ.get("SIGNAL_CACHE_MAX_BYTES", 1024 ** 3))
+        # Quiz generation: "openai", or "stub" for the deterministic offline backend
+        self.QUIZ_BACKEND = os.environ.get("QUIZ_BACKEND", "openai")
+        self.QUIZ_STUB_LATENCY = float(os.environ.get("QUIZ_STUB_LATENCY", 0))  # Seconds per stub quiz
+        self.QUIZ_CACHE_SIZE = 128  # Quizzes kept in memory, by transcript
+        self.QUIZ_MAX_CONCURRENCY = 4  # Quiz requests in flight at once
+        self.QUIZ_TIMEOUT = 30  # Seconds per quiz request
+        self.QUIZ_RETRIES = 2  # Extra attempts after a timeout or transient API error
+        # Classroom mode: many students in one camera
+        self.CLASSROOM_MAX_FACES = 40
+        self.CLASSROOM_MATCH_DISTANCE = 0.5  # Face widths a face may move between analysed frames
+        self.CLASSROOM_TRACK_TIMEOUT = 10  # Seconds a student may be out of view before the track ends
+        # Per-stage timings of the pipeline, shown in the sidebar when enabled
+        self.TIMINGS_ENABLED = os.environ.get("FOCUS_TIMINGS", "0") == "1"
+        self.TIMINGS_WINDOW = 2048  # Most recent durations kept per stage
+        self.DASHBOARD_MAX_POINTS = 600  # Time buckets drawn in the dashboard's focus chart
+        self.REPORT_MAX_POINTS = 2000  # Points kept in the HTML report's focus line; 0 keeps every frame
 
 
 
@@ -32,18 +67,17 @@ RIGHT_EYE = [33, 7, 163, 144, 145, 153, 154, 155,
 LEFT_IRIS = [474, 475, 476, 477]
 RIGHT_IRIS = [469, 470, 471, 472]
 
-# Initialize global variables for tracking
-focus_score = 50  # Initialized start focus from 50
-last_look_centered_time = None
-not_looking_start_time = None
-blink_start_time = None
-total_blinks = 0
-blink_detected = False
-eyes_closed_start_time = None
-# Variables to track the last time we increased or decreased the focus score
-last_focus_increase_time = None
-last_focus_decrease_time = None
-
-# Initialize Whisper model and OpenAI API key placeholder
-model = None  # We will load the model when needed
+# Label sets of the per-frame results; list positions are the stored category codes
+EYE_DIRECTIONS = ["Not Detected", "Left", "Right", "Center", "Blink"]
+FACE_POSITIONS = ["Not Detected", "Forward", "Looking Left", "Looking Right", "Looking Down", "Looking Up"]
+EYE_DIRECTION_CODES = {label: code for code, label in enumerate(EYE_DIRECTIONS)}
+FACE_POSITION_CODES = {label: code for code, label in enumerate(FACE_POSITIONS)}
+
+# Labelling rules shared by single-face and classroom analysis; head angles are in face_signals units
+BLINK_RATIO = 5.5  # Eye width over height above which the eyes count as closed
+IRIS_SIDE_BAND = 0.3  # Share of the eye width at each side where the iris counts as looking aside
+YAW_LIMIT = 10  # Yaw below -YAW_LIMIT is looking left, above it looking right
+PITCH_DOWN, PITCH_UP = -10, 20
+
+# OpenAI API key placeholder
 openai_api_key = None  # We will prompt the user to enter the API key
\ No newline at end of file
@@ -1,16 +1,61 @@
 import altair as alt
+import numpy as np
+import pandas as pd
 import streamlit as st
+from constants import config
+
+# Bucket sizes (seconds) the focus chart is aggregated to; the smallest one that keeps
+# the visible window under config.DASHBOARD_MAX_POINTS buckets is used
+BUCKET_SECONDS = [0.1, 0.2, 0.5, 1, 2, 5, 10, 15, 30, 60, 120, 300, 600]
+
+def bucket_seconds_for(window_seconds, max_points):
+    for seconds in BUCKET_SECONDS:
+        if window_seconds / seconds < max_points:
+            return seconds
+    return window_seconds / max_points
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def focus_bands(result_id, _df, start_minute, end_minute, bucket_seconds):
+    # Mean/min/max focus score per time bucket between start_minute and end_minute.
+    # Cached per result (result_id changes whenever the scores do) and window.
+    minutes = _df['timestamp_min'].to_numpy()
+    lo = np.searchsorted(minutes, start_minute, side='left')
+    hi = np.searchsorted(minutes, end_minute, side='right')
+    minutes = minutes[lo:hi]
+    scores = _df['focus_score'].to_numpy()[lo:hi].astype(np.float64)
+    if len(minutes) == 0:
+        return pd.DataFrame({'minute': [], 'mean': [], 'min': [], 'max': []})
+
+    # Frames are in time order, so each bucket is a contiguous run
+    buckets = np.floor(minutes * 60 / bucket_seconds).astype(np.int64)
+    starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    counts = np.diff(np.append(starts, len(buckets)))
+    return pd.DataFrame({
+        'minute': buckets[starts] * bucket_seconds / 60,
+        'mean': np.add.reduceat(scores, starts) / counts,
+        'min': np.minimum.reduceat(scores, starts),
+        'max': np.maximum.reduceat(scores, starts),
+    })
 
 def create_dashboard(df, avg_focus_score_before_quiz, avg_focus_score_after_quiz):
     # Focus Score Trend
+    # Only the aggregated bands of the selected window are sent to the browser;
+    # zooming in re-aggregates that window at a finer bucket size
+    duration = float(df['timestamp_min'].iloc[-1]) if len(df) else 0.0
+    window = (0.0, duration)
+    if duration > 0:
+        window = st.slider("Zoom (minutes)", 0.0, duration, window, key="dashboard_zoom")
+    bucket_seconds = bucket_seconds_for((window[1] - window[0]) * 60, config.DASHBOARD_MAX_POINTS)
+    bands = focus_bands(df.attrs['result_id'], df, window[0], window[1], bucket_seconds)
+
     # Create an Altair chart with custom axis labels
-    chart = alt.Chart(df).mark_line().encode(
-        x=alt.X('timestamp_min', title='Time (minutes)'),
-        y=alt.Y('focus_score', title='Focus Score')
-    )
+    base = alt.Chart(bands).encode(x=alt.X('minute', title='Time (minutes)', scale=alt.Scale(domain=list(window))))
+    band = base.mark_area(opacity=0.3).encode(y=alt.Y('min', title='Focus Score'), y2='max')
+    line = base.mark_line().encode(y='mean')
 
     # Display the chart in Streamlit
-    st.altair_chart(chart, use_container_width=True)
+    st.altair_chart(band + line, use_container_width=True)
+    st.caption(f"Mean focus score per {bucket_seconds:g} s, shaded between the minimum and maximum")
     # Display Average Focus Scores
     st.markdown(
     f"""
@@ -31,4 +76,4 @@ def create_dashboard(df, avg_focus_score_before_quiz, avg_focus_score_after_quiz
     unsafe_allow_html=True
     )
 
-    return avg_focus_score_after_quiz  # Return the final average focus score
\ No newline at end of file
+    return avg_focus_score_after_quiz  # Return the final average focus score
@@ -0,0 +1,29 @@
+import numpy as np
+
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: pick `threshold` points of the series (x, y) that keep
+    # its visual shape. The first and last points are kept; every bucket in between keeps
+    # the point forming the largest triangle with the previously kept point and the mean
+    # of the next bucket, so peaks and dips survive. Returns the kept indices.
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # threshold - 2 buckets over the interior points, with their means precomputed
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    counts = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[:-1], edges[:-1]) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[:-1], edges[:-1]) / counts, y[-1])
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    kept = 0
+    for bucket, (start, end) in enumerate(zip(edges[:-1].tolist(), edges[1:].tolist())):
+        next_x, next_y = mean_x[bucket + 1], mean_y[bucket + 1]
+        area = np.abs((x[kept] - next_x) * (y[start:end] - y[kept]) - (x[kept] - x[start:end]) * (next_y - y[kept]))
+        kept = start + int(area.argmax())
+        indices[bucket + 1] = kept
+    return indices
@@ -1,246 +1,586 @@
 import cv2 as cv
 import mediapipe as mp
 import numpy as np
-import math
+import itertools
 import time
+import uuid
+import threading
 import av
-import tempfile
 import pandas as pd
+from collections import namedtuple
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from streamlit_webrtc import VideoProcessorBase
 from constants import *
 from constants import config
+from scoring import FocusScorer, score_signals
+from frame_buffer import ColumnBuffer, concatenate
+import signal_cache
+import timings
+from session_summary import SessionSummary
+from head_pose import HeadPoseEstimator
+from motion_gate import MotionGate
 
 mp_face_mesh = mp.solutions.face_mesh
 
-def euclidean_distance(point1, point2):
-    return math.hypot(point2[0] - point1[0], point2[1] - point1[1])
-
-def blink_ratio(landmarks, right_indices, left_indices):
-    rh_distance = euclidean_distance(landmarks[right_indices[0]], landmarks[right_indices[8]])
-    rv_distance = euclidean_distance(landmarks[right_indices[12]], landmarks[right_indices[4]])
-    lh_distance = euclidean_distance(landmarks[left_indices[0]], landmarks[left_indices[8]])
-    lv_distance = euclidean_distance(landmarks[left_indices[12]], landmarks[left_indices[4]])
-
-    if rv_distance == 0 or lv_distance == 0:
+FACE_MESH_SETTINGS = {
+    'max_num_faces': 1,
+    'refine_landmarks': True,
+    'min_detection_confidence': 0.7,
+    'min_tracking_confidence': 0.7,
+}
+
+INFERENCE_INTERPOLATION = cv.INTER_LINEAR  # INTER_AREA costs more than it saves on 1080p frames
+
+MIN_SEGMENT_SECONDS = 30  # Shorter videos are not worth the cost of starting extra workers
+
+# What analyze_frame measures on one frame. pitch and yaw are the head pose angles that
+# face_position is derived from, left_eye/right_eye the per-eye gaze behind eye_direction.
+FrameSignals = namedtuple('FrameSignals', ['eye_direction', 'face_position', 'blink_ratio', 'pitch', 'yaw', 'left_eye', 'right_eye'])
+NO_FACE_SIGNALS = FrameSignals("Not Detected", "Not Detected", np.nan, np.nan, np.nan, "Not Detected", "Not Detected")
+
+# Per-frame signals extracted from a video; labels are stored as category codes
+SIGNAL_COLUMNS = {
+    'timestamp': np.float64,
+    'eye_direction': np.int8,
+    'face_position': np.int8,
+    'blink_ratio': np.float32,
+    'pitch': np.float32,
+    'yaw': np.float32,
+    'left_eye': np.int8,
+    'right_eye': np.int8,
+    'inferred': np.bool_,  # False where the motion gate reused the previous analysed frame's signals
+}
+
+POSE_LANDMARKS = [1, 33, 61, 199, 263, 291]  # Nose, eye corners, mouth corners and chin
+EYE_BOX_LANDMARKS = LEFT_EYE + RIGHT_EYE
+# Landmark pairs spanning each eye horizontally and vertically, rows are (right eye, left eye)
+EYE_HORIZONTAL = np.array([[RIGHT_EYE[0], RIGHT_EYE[8]], [LEFT_EYE[0], LEFT_EYE[8]]])
+EYE_VERTICAL = np.array([[RIGHT_EYE[12], RIGHT_EYE[4]], [LEFT_EYE[12], LEFT_EYE[4]]])
+
+def eye_distances(landmarks, pairs):
+    segments = landmarks[pairs]
+    delta = segments[:, 1] - segments[:, 0]
+    return np.hypot(delta[:, 0], delta[:, 1])
+
+def blink_ratio(landmarks):
+    h_distance = eye_distances(landmarks, EYE_HORIZONTAL)
+    v_distance = eye_distances(landmarks, EYE_VERTICAL)
+
+    if not v_distance.all():
         return float('inf')
 
-    re_ratio = rh_distance / rv_distance
-    le_ratio = lh_distance / lv_distance
+    re_ratio, le_ratio = (h_distance / v_distance).tolist()
     return (re_ratio + le_ratio) / 2
 
+# Wire layout of a serialized NormalizedLandmarkList whose landmarks only carry x, y and z:
+# one length-delimited record per landmark holding three fixed32 floats
+LANDMARK_RECORD = np.dtype([
+    ("tag", "u1"), ("size", "u1"),
+    ("x_tag", "u1"), ("x", "<f4"),
+    ("y_tag", "u1"), ("y", "<f4"),
+    ("z_tag", "u1"), ("z", "<f4"),
+])
+
+def landmark_array(face_landmarks):
+    data = face_landmarks.SerializeToString()
+    if len(data) % LANDMARK_RECORD.itemsize == 0:
+        records = np.frombuffer(data, dtype=LANDMARK_RECORD)
+        if ((records["tag"] == 0x0A) & (records["size"] == LANDMARK_RECORD.itemsize - 2)
+                & (records["x_tag"] == 0x0D) & (records["y_tag"] == 0x15) & (records["z_tag"] == 0x1D)).all():
+            return np.column_stack((records["x"], records["y"], records["z"])).astype(np.float64)
+
+    # Landmarks with extra fields (visibility, presence) don't fit the fixed layout
+    landmarks = face_landmarks.landmark
+    return np.fromiter(
+        itertools.chain.from_iterable((point.x, point.y, point.z) for point in landmarks),
+        dtype=np.float64,
+        count=3 * len(landmarks),
+    ).reshape(-1, 3)
+
 def landmarks_detection(img, results):
+    # All landmarks as one (N, 3) array: x and y in pixels, z as given by FaceMesh
     img_height, img_width = img.shape[:2]
-    return [(int(point.x * img_width), int(point.y * img_height)) for point in results.multi_face_landmarks[0].landmark]
-
-def eye_direction(eye_points, iris_center, ratio):
-    eye_left = np.min(eye_points[:, 0])
-    eye_right = np.max(eye_points[:, 0])
-
+    points = landmark_array(results.multi_face_landmarks[0])
+    points[:, 0] *= img_width
+    points[:, 1] *= img_height
+    return points
+
+def eye_direction_codes(eye_x, iris_x, ratio):
+    # EYE_DIRECTIONS codes from the x coordinates of eye landmarks (..., K), the iris
+    # centres' x (...) and the blink ratios (...): one eye, or one per face in a batch
+    eye_left = np.min(eye_x, axis=-1)
+    eye_right = np.max(eye_x, axis=-1)
     hor_range = eye_right - eye_left
-    iris_x, _ = iris_center
-
-    if ratio > 5.5:
-        return "Blink"
-    elif iris_x < eye_left + hor_range * 0.3:
-        return "Left"
-    elif iris_x > eye_right - hor_range * 0.3:
-        return "Right"
-    else:
-        return "Center"
-
-def process_frame(frame, face_mesh, focus_score, last_look_centered_time, not_looking_start_time, blink_start_time, blink_detected, last_focus_increase_time, last_focus_decrease_time):
-    frame = cv.flip(frame, 1)
-    rgb_frame = cv.cvtColor(frame, cv.COLOR_BGR2RGB)
-    results = face_mesh.process(rgb_frame)
-
-    eye_direction_text = "Not Detected"
-    face_position = "Not Detected"
-
-    current_time = time.time()
-
-    if results.multi_face_landmarks:
-        mesh_points = landmarks_detection(frame, results)
-        
-        # Face position monitoring
-        face_3d = []
-        face_2d = []
-        for idx, lm in enumerate(results.multi_face_landmarks[0].landmark):
-            if idx in [1, 33, 61, 199, 263, 291]:
-                x, y = int(lm.x * frame.shape[1]), int(lm.y * frame.shape[0])
-                face_2d.append([x, y])
-                face_3d.append([x, y, lm.z])
-        
-        face_2d = np.array(face_2d, dtype=np.float64)
-        face_3d = np.array(face_3d, dtype=np.float64)
-
-        focal_length = 1 * frame.shape[1]
-        cam_matrix = np.array([[focal_length, 0, frame.shape[1] / 2],
-                               [0, focal_length, frame.shape[0] / 2],
-                               [0, 0, 1]])
-        dist_matrix = np.zeros((4, 1), dtype=np.float64)
-        success, rot_vec, trans_vec = cv.solvePnP(face_3d, face_2d, cam_matrix, dist_matrix)
-        rmat, jac = cv.Rodrigues(rot_vec)
-        angles, mtxR, mtxQ, Qx, Qy, Qz = cv.RQDecomp3x3(rmat)
-
-        x = angles[0] * 360
-        y = angles[1] * 360
-
-        if y < -10:
-            face_position = "Looking Left"
-        elif y > 10:
-            face_position = "Looking Right"
-        elif x < -10:
-            face_position = "Looking Down"
-        elif x > 20:
-            face_position = "Looking Up"
-        else:
-            face_position = "Forward"
-
-            
-       # Eye direction and blink detection
-        ratio = blink_ratio(mesh_points, RIGHT_EYE, LEFT_EYE)
-        left_iris_points = np.array([mesh_points[i] for i in LEFT_IRIS], dtype=np.int32)
-        right_iris_points = np.array([mesh_points[i] for i in RIGHT_IRIS], dtype=np.int32)
-        (l_cx, l_cy), l_radius = cv.minEnclosingCircle(left_iris_points)
-        (r_cx, r_cy), r_radius = cv.minEnclosingCircle(right_iris_points)
+    return np.select(
+        [ratio > BLINK_RATIO, iris_x < eye_left + hor_range * IRIS_SIDE_BAND, iris_x > eye_right - hor_range * IRIS_SIDE_BAND],
+        [EYE_DIRECTION_CODES[label] for label in ("Blink", "Left", "Right")],
+        default=EYE_DIRECTION_CODES["Center"],
+    ).astype(np.int8)
+
+def both_eyes_code(left_code, right_code):
+    # One direction for both eyes; where they disagree a sideways look wins over the other eye
+    sideways = (left_code == EYE_DIRECTION_CODES["Left"]) | (left_code == EYE_DIRECTION_CODES["Right"])
+    return np.where((left_code == right_code) | sideways, left_code, right_code).astype(np.int8)
+
+def face_position_codes(pitch, yaw):
+    # FACE_POSITIONS codes of head angles in face_signals units, for one face or a batch
+    return np.select(
+        [yaw < -YAW_LIMIT, yaw > YAW_LIMIT, pitch < PITCH_DOWN, pitch > PITCH_UP],
+        [FACE_POSITION_CODES[label] for label in ("Looking Left", "Looking Right", "Looking Down", "Looking Up")],
+        default=FACE_POSITION_CODES["Forward"],
+    ).astype(np.int8)
+
+def motion_boxes(points, frame_width):
+    # Boxes around the face and around both eyes for the motion gate, (x0, y0, x1, y1)
+    # in pixels of the frame as it was before the flip the landmarks were found on
+    boxes = []
+    for box_points in (points, points[EYE_BOX_LANDMARKS]):
+        x0, y0 = box_points[:, :2].min(axis=0)
+        x1, y1 = box_points[:, :2].max(axis=0)
+        boxes.append((frame_width - x1, y0, frame_width - x0, y1))
+    return boxes
+
+def analyze_frame(frame, face_mesh, head_pose=None, motion_gate=None, timestamp=None):
+    # `head_pose` carries the pose from frame to frame of one stream; without it every
+    # frame is solved from scratch. With a `motion_gate`, a frame at `timestamp` that
+    # looks like the last analysed one gets its signals without running FaceMesh; the
+    # gate compares the frames as they come in, before the flip.
+    if motion_gate is not None:
+        with timings.stage("motion_gate"):
+            signals = motion_gate.reuse(frame, timestamp)
+        if signals is not None:
+            return cv.flip(frame, 1), signals
+    original = frame
+
+    with timings.stage("convert"):
+        frame = cv.flip(frame, 1)
+        rgb_frame = cv.cvtColor(frame, cv.COLOR_BGR2RGB)
+    with timings.stage("face_mesh"):
+        results = face_mesh.process(rgb_frame)
+
+    if not results.multi_face_landmarks:
+        if head_pose is not None:
+            head_pose.reset()
+        if motion_gate is not None:
+            motion_gate.update(original, timestamp, NO_FACE_SIGNALS)
+        return frame, NO_FACE_SIGNALS
+
+    with timings.stage("landmarks"):
+        points = landmarks_detection(frame, results)
+    signals = face_signals(points, frame.shape[1], frame.shape[0], head_pose)
+    if motion_gate is not None:
+        motion_gate.update(original, timestamp, signals, motion_boxes(points, frame.shape[1]))
+    return frame, signals
+
+def analyze_frame_offline(frame, face_mesh, inference_width=None, head_pose=None, motion_gate=None, timestamp=None):
+    # analyze_frame for frames nobody looks at. FaceMesh runs on a copy at most
+    # `inference_width` pixels wide, which is flipped and converted instead of the full
+    # frame, and the landmarks are scaled back to full-resolution pixels, so pose and
+    # iris are measured on the same scale as before. Nothing is drawn or returned, and
+    # the motion gate compares the full-resolution frames.
+    inference_width = config.INFERENCE_WIDTH if inference_width is None else inference_width
+    height, width = frame.shape[:2]
+    if motion_gate is not None:
+        with timings.stage("motion_gate"):
+            signals = motion_gate.reuse(frame, timestamp)
+        if signals is not None:
+            return signals
+    original = frame
+    with timings.stage("convert"):
+        if inference_width and width > inference_width:
+            frame = cv.resize(frame, (inference_width, round(height * inference_width / width)), interpolation=INFERENCE_INTERPOLATION)
+        rgb_frame = cv.cvtColor(cv.flip(frame, 1), cv.COLOR_BGR2RGB)
+    with timings.stage("face_mesh"):
+        results = face_mesh.process(rgb_frame)
+
+    if not results.multi_face_landmarks:
+        if head_pose is not None:
+            head_pose.reset()
+        if motion_gate is not None:
+            motion_gate.update(original, timestamp, NO_FACE_SIGNALS)
+        return NO_FACE_SIGNALS
+
+    with timings.stage("landmarks"):
+        points = landmark_array(results.multi_face_landmarks[0])
+        points[:, 0] *= width
+        points[:, 1] *= height
+    signals = face_signals(points, width, height, head_pose)
+    if motion_gate is not None:
+        motion_gate.update(original, timestamp, signals, motion_boxes(points, width))
+    return signals
+
+def face_signals(points, frame_width, frame_height, head_pose=None):
+    # Signals of one face from its landmarks in pixels, on a (flipped) frame of this size
+    mesh_points = points[:, :2].astype(np.int32)
+
+    # Face position monitoring
+    face_2d = mesh_points[POSE_LANDMARKS].astype(np.float64)
+    face_3d = np.column_stack((face_2d, points[POSE_LANDMARKS, 2]))
+
+    if head_pose is None:
+        head_pose = HeadPoseEstimator()
+    with timings.stage("head_pose"):
+        pitch, yaw = head_pose.angles(face_3d, face_2d, frame_width, frame_height)
+
+    x = pitch * 360
+    y = yaw * 360
+
+    face_position = FACE_POSITIONS[face_position_codes(x, y)]
+
+    # Eye direction and blink detection
+    with timings.stage("eyes"):
+        ratio = blink_ratio(mesh_points)
+        (l_cx, l_cy), l_radius = cv.minEnclosingCircle(mesh_points[LEFT_IRIS])
+        (r_cx, r_cy), r_radius = cv.minEnclosingCircle(mesh_points[RIGHT_IRIS])
         center_left = np.array([l_cx, l_cy], dtype=np.int32)
         center_right = np.array([r_cx, r_cy], dtype=np.int32)
-        left_eye_direction = eye_direction(np.array([mesh_points[p] for p in LEFT_EYE]), center_left, ratio)
-        right_eye_direction = eye_direction(np.array([mesh_points[p] for p in RIGHT_EYE]), center_right, ratio)
+        left_code = eye_direction_codes(mesh_points[LEFT_EYE, 0], center_left[0], ratio)
+        right_code = eye_direction_codes(mesh_points[RIGHT_EYE, 0], center_right[0], ratio)
+    left_eye_direction, right_eye_direction = EYE_DIRECTIONS[left_code], EYE_DIRECTIONS[right_code]
+    eye_direction_text = EYE_DIRECTIONS[both_eyes_code(left_code, right_code)]
 
-        if left_eye_direction == right_eye_direction:
-            eye_direction_text = left_eye_direction
-        else:
-            eye_direction_text = left_eye_direction if left_eye_direction in ["Left", "Right"] else right_eye_direction
-
-        # Focus scoring algorithm
-        if face_position == "Forward" and eye_direction_text == "Center":
-            if last_look_centered_time is None:
-                last_look_centered_time = current_time
-            not_looking_start_time = None
-            if current_time - last_look_centered_time >= config.CENTER_THRESHOLD:
-                # Increase focus score by 5% every 1 second when increasing
-                if last_focus_increase_time is None or current_time - last_focus_increase_time >= 0.1:
-                    focus_score = min(100, focus_score + 0.3)
-                    last_focus_increase_time = current_time
-        else:
-            last_look_centered_time = None
-            if not not_looking_start_time:
-                not_looking_start_time = current_time
-            elif current_time - not_looking_start_time >= config.SIDE_THRESHOLD:
-                # Decrease focus score by 5% every 1 second when decreasing
-                if last_focus_decrease_time is None or current_time - last_focus_decrease_time >= 0.1:
-                    focus_score = max(0, focus_score - config.DISCOUNT_SIDE)
-                    last_focus_decrease_time = current_time
-
-        if ratio > 5.5:
-            if not blink_detected:
-                blink_start_time = current_time
-                blink_detected = True
-            elif current_time - blink_start_time >= config.BLINK_THRESHOLD:
-                # Decrease focus score by 20% if eyes are closed for 5 seconds
-                if last_focus_decrease_time is None or current_time - last_focus_decrease_time >= 0.1:
-                    focus_score = max(0, focus_score - config.DISCOUNT_EYES)
-                    blink_start_time = current_time
-        else:
-            if blink_detected:
-                blink_detected = False
+    return FrameSignals(eye_direction_text, face_position, ratio, x, y, left_eye_direction, right_eye_direction)
 
+def draw_overlay(frame, face_position, eye_direction_text, focus_score):
+    if face_position != "Not Detected":
         # Display information on frame
-        cv.putText(frame, f"Face: {face_position}", (50, 50), FONTS, 1, (255, 0, 0), 2, cv.LINE_AA)
-        cv.putText(frame, f"Eyes: {eye_direction_text}", (50, 100), FONTS, 1, (0, 255, 0), 2, cv.LINE_AA)
-        cv.putText(frame, f"Focus Score: {int(focus_score)}%", (50, 150), FONTS, 1, (0, 0, 255), 2, cv.LINE_AA)
-
-    else:
-        # If no face is detected, decrease focus score by 1% every 1 second
-        if last_focus_decrease_time is None or current_time - last_focus_decrease_time >= 0.1:
-            focus_score = max(0, focus_score - 0.5)
-            last_focus_decrease_time = current_time
-
-    return (frame, focus_score, last_look_centered_time, not_looking_start_time, blink_start_time, blink_detected, eye_direction_text, face_position, last_focus_increase_time, last_focus_decrease_time)
-
-def video_frame_callback(frame: av.VideoFrame) -> av.VideoFrame:
-    img = frame.to_ndarray(format="bgr24")
-    global focus_score, last_look_centered_time, not_looking_start_time, blink_start_time, blink_detected
-    global last_focus_increase_time, last_focus_decrease_time
-
-    with mp_face_mesh.FaceMesh(
-        max_num_faces=1,
-        refine_landmarks=True,
-        min_detection_confidence=0.7,
-        min_tracking_confidence=0.7,
-    ) as face_mesh:
-        (img, focus_score, last_look_centered_time, not_looking_start_time, 
-         blink_start_time, blink_detected, _, _, last_focus_increase_time, last_focus_decrease_time) = process_frame(
-            img, face_mesh, focus_score, last_look_centered_time, not_looking_start_time, 
-            blink_start_time, blink_detected, last_focus_increase_time, last_focus_decrease_time
-        )
-
-    return av.VideoFrame.from_ndarray(img, format="bgr24")
-
-def process_uploaded_video(video_file):
-    tfile = tempfile.NamedTemporaryFile(delete=False) 
-    tfile.write(video_file.read())
-    
-    cap = cv.VideoCapture(tfile.name)
-    
-    global focus_score, last_look_centered_time, not_looking_start_time, blink_start_time, blink_detected
-    # Initialize the new variables
-    last_focus_increase_time = None
-    last_focus_decrease_time = None
-
-    focus_score = 50  # Initialized start focus from 50
-    last_look_centered_time = None
-    not_looking_start_time = None
-    blink_start_time = None
-    blink_detected = False
-    
-    data = []
-    start_time = None
-    
-    with mp_face_mesh.FaceMesh(
-        max_num_faces=1,
-        refine_landmarks=True,
-        min_detection_confidence=0.7,
-        min_tracking_confidence=0.7,
-    ) as face_mesh:
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            (frame, focus_score, last_look_centered_time, not_looking_start_time, 
-             blink_start_time, blink_detected, eye_direction, face_position, last_focus_increase_time, last_focus_decrease_time) = process_frame(
-                frame, face_mesh, focus_score, last_look_centered_time, not_looking_start_time, 
-                blink_start_time, blink_detected, last_focus_increase_time, last_focus_decrease_time
+        with timings.stage("overlay"):
+            cv.putText(frame, f"Face: {face_position}", (50, 50), FONTS, 1, (255, 0, 0), 2, cv.LINE_AA)
+            cv.putText(frame, f"Eyes: {eye_direction_text}", (50, 100), FONTS, 1, (0, 255, 0), 2, cv.LINE_AA)
+            cv.putText(frame, f"Focus Score: {int(focus_score)}%", (50, 150), FONTS, 1, (0, 0, 255), 2, cv.LINE_AA)
+    return frame
+
+def process_frame(frame, face_mesh, scorer, current_time, head_pose=None, motion_gate=None):
+    frame, signals = analyze_frame(frame, face_mesh, head_pose, motion_gate, current_time)
+    eye_direction_text, face_position = signals.eye_direction, signals.face_position
+    focus_score = scorer.update(current_time, face_position, eye_direction_text, signals.blink_ratio)
+    draw_overlay(frame, face_position, eye_direction_text, focus_score)
+    return frame, eye_direction_text, face_position
+
+def create_face_mesh():
+    return mp_face_mesh.FaceMesh(**FACE_MESH_SETTINGS)
+
+# Outcome of the last live frame the worker analysed, drawn over the frames that follow it
+LiveResult = namedtuple('LiveResult', ['timestamp', 'eye_direction', 'face_position', 'focus_score'])
+
+class FocusVideoProcessor(VideoProcessorBase):
+    # One instance per WebRTC connection. recv() hands each frame to a background worker
+    # and draws the most recent finished result on it, so the returned video stays in
+    # step with the camera however slow inference gets. Only when the worker is idle does
+    # recv() wait for the frame's own result, for at most LIVE_LATENCY_BUDGET seconds.
+    # A frame that arrives while the worker is busy replaces the one still waiting
+    # (latest frame wins); replaced frames are never analysed and only counted. The
+    # FaceMesh graph and the head pose estimator are built once and keep their tracking
+    # across frames until the stream ends. Given a live_sessions.LiveSessionManager, the
+    # analysis runs in one of its worker processes instead, and only scoring stays here;
+    # if the worker fails, the stream falls back to analysis in this process. A frame
+    # that cannot be analysed at all is scored as one without a face.
+    def __init__(self, sessions=None):
+        self.session = None
+        self.errors = 0
+        self.last_error = None
+        if sessions is not None:
+            try:
+                self.session = sessions.open_session()
+            except Exception as e:
+                self._record_error(e)
+        if self.session is None:
+            self._start_local_analysis()
+        self.scorer = FocusScorer()
+        self.summary = SessionSummary()
+        self.condition = threading.Condition()
+        self.pending = None  # (image, timestamp) waiting for the worker
+        self.busy = False
+        self.result = None
+        self.frames_dropped = 0
+        self.frames_inferred = 0
+        self.frames_reused = 0  # Frames the motion gate answered without FaceMesh
+        self.running = True
+        self.worker = threading.Thread(target=self._analyze_frames, daemon=True)
+        self.worker.start()
+
+    def _analyze_frames(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending is not None or not self.running)
+                if not self.running:
+                    return
+                img, timestamp = self.pending
+                self.pending = None
+                self.busy = True
+
+            try:
+                signals, reused = self._analyze(img, timestamp)
+                if reused:
+                    self.frames_reused += 1
+                else:
+                    self.frames_inferred += 1
+            except Exception as e:
+                self._record_error(e)
+                signals = NO_FACE_SIGNALS
+            focus_score = self.scorer.update(timestamp, signals.face_position, signals.eye_direction, signals.blink_ratio)
+            self.summary.update(timestamp, EYE_DIRECTION_CODES[signals.eye_direction],
+                                FACE_POSITION_CODES[signals.face_position], focus_score)
+
+            with self.condition:
+                self.result = LiveResult(timestamp, signals.eye_direction, signals.face_position, focus_score)
+                self.busy = False
+                self.condition.notify_all()
+
+    def _start_local_analysis(self):
+        self.face_mesh = create_face_mesh()
+        self.head_pose = HeadPoseEstimator()
+        self.motion_gate = MotionGate()
+
+    def _record_error(self, error):
+        self.errors += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+
+    def _analyze(self, img, timestamp):
+        # (signals, whether the motion gate reused the last analysed frame's signals)
+        if self.session is not None:
+            try:
+                return self.session.analyze(img, timestamp), self.session.reused
+            except Exception as e:
+                self._record_error(e)
+                self.session.close()
+                self.session = None
+                self._start_local_analysis()
+        _, signals = analyze_frame(img, self.face_mesh, self.head_pose, self.motion_gate, timestamp)
+        return signals, self.motion_gate.reused
+
+    def recv(self, frame: av.VideoFrame) -> av.VideoFrame:
+        with timings.stage("live_frame"):
+            return self._show_frame(frame)
+
+    def _show_frame(self, frame):
+        img = frame.to_ndarray(format="bgr24")
+        # Score on the stream's presentation time; fall back to arrival time when pts is missing
+        timestamp = frame.time if frame.time is not None else time.monotonic()
+
+        with self.condition:
+            if self.pending is not None:
+                self.frames_dropped += 1
+            idle = not self.busy
+            self.pending = (img, timestamp)
+            self.condition.notify_all()
+            if idle:
+                self.condition.wait_for(lambda: self.result is not None and self.result.timestamp >= timestamp,
+                                        timeout=config.LIVE_LATENCY_BUDGET)
+            result = self.result
+
+        img = cv.flip(img, 1)
+        if result is not None:
+            draw_overlay(img, result.face_position, result.eye_direction, result.focus_score)
+        return av.VideoFrame.from_ndarray(img, format="bgr24")
+
+    def on_ended(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.worker.join()
+        if self.session is not None:
+            self.session.close()
+        else:
+            self.face_mesh.close()
+
+_frames_done = None  # Frame counter shared by the segment workers of one analysis
+
+def _init_segment_worker(frames_done, settings):
+    # Spawned workers start from the default Config; `settings` is the parent's, so
+    # runtime changes (motion gate, timings, ...) apply to every segment alike
+    global _frames_done
+    _frames_done = frames_done
+    vars(config).update(settings)
+
+def _count_segment_frames(frames):
+    with _frames_done.get_lock():
+        _frames_done.value += frames
+
+def analysis_stride(video_fps, analysis_fps=None):
+    # Only every `stride`-th frame is decoded and analysed, the others are just grabbed
+    analysis_fps = analysis_fps or config.ANALYSIS_FPS
+    return max(1, round(video_fps / analysis_fps)) if video_fps > 0 and analysis_fps else 1
+
+def sampled_frames(cap, start_frame, end_frame, stride, progress=None):
+    # Yield (timestamp, frame) for every stride-th frame in [start_frame, end_frame).
+    # `progress` is called with the number of frames advanced since its last call.
+    if start_frame:
+        cap.set(cv.CAP_PROP_POS_FRAMES, start_frame)
+
+    # "decode" covers every grab since the previous analysed frame, skipped frames included
+    timed = config.TIMINGS_ENABLED
+    started = time.perf_counter() if timed else 0
+    frame_index = start_frame - 1
+    while cap.isOpened() and (end_frame is None or frame_index + 1 < end_frame):
+        if not cap.grab():
+            break
+        frame_index += 1
+        # Strides are aligned on the absolute frame index so segment boundaries don't shift them
+        if frame_index % stride:
+            continue
+        ret, frame = cap.retrieve()
+        if not ret:
+            break
+
+        timestamp = cap.get(cv.CAP_PROP_POS_MSEC) / 1000  # Convert to seconds
+        if timed:
+            timings.record("decode", time.perf_counter() - started)
+        yield timestamp, frame
+        if progress:
+            progress(stride)
+        if timed:
+            started = time.perf_counter()
+
+def analyze_segment(video_path, start_frame, end_frame, stride, progress=None, inference_width=None):
+    # Extract per-frame signals for frames [start_frame, end_frame) with a private
+    # capture and FaceMesh, so segments can run in separate processes
+    cap = cv.VideoCapture(video_path)
+    signals = ColumnBuffer(SIGNAL_COLUMNS)
+    head_pose = HeadPoseEstimator()
+    motion_gate = MotionGate()
+    with create_face_mesh() as face_mesh:
+        for timestamp, frame in sampled_frames(cap, start_frame, end_frame, stride, progress):
+            frame_signals = analyze_frame_offline(frame, face_mesh, inference_width, head_pose, motion_gate, timestamp)
+            signals.append(
+                timestamp,
+                EYE_DIRECTION_CODES[frame_signals.eye_direction],
+                FACE_POSITION_CODES[frame_signals.face_position],
+                frame_signals.blink_ratio,
+                frame_signals.pitch,
+                frame_signals.yaw,
+                EYE_DIRECTION_CODES[frame_signals.left_eye],
+                EYE_DIRECTION_CODES[frame_signals.right_eye],
+                not motion_gate.reused,
             )
-            
-            timestamp = cap.get(cv.CAP_PROP_POS_MSEC) / 1000  # Convert to seconds
-            
-            if start_time is None:
-                start_time = timestamp
-
-            data.append({
-                'timestamp': timestamp,
-                'focus_score': focus_score,
-                'eye_direction': eye_direction,
-                'face_position': face_position,
-                'is_front_camera': face_position != "Not Detected",
-                'delta_time': 1/30  # Assuming 30 FPS for delta_time
-            })
-    
+
     cap.release()
-    df = pd.DataFrame(data)
-    df['timestamp_min'] = (df['timestamp'] - start_time) / 60  # Convert to minutes
+    return signals.arrays()
 
-    # Calculate delta_time
-    df['delta_time'] = df['timestamp'].diff().fillna(0)
+def _analyze_segment_in_worker(*args):
+    # analyze_segment in a worker process, with the timings it recorded for the parent to merge
+    return analyze_segment(*args), timings.drain()
 
-    # Calculate Front Camera and Not Front Camera Time
-    total_front_time = df[df['is_front_camera']]['delta_time'].sum()
-    total_not_front_time = df[~df['is_front_camera']]['delta_time'].sum()
-    total_time = total_front_time + total_not_front_time
+def extract_video_signals(video_path, analysis_fps=None, workers=None, progress=None):
+    # `progress`, if given, is called with the fraction of the video analysed so far
+    cap = cv.VideoCapture(video_path)
+    video_fps = cap.get(cv.CAP_PROP_FPS)
+    frame_count = int(cap.get(cv.CAP_PROP_FRAME_COUNT))
+    cap.release()
 
-    df.attrs['front_camera_percentage'] = (total_front_time / total_time) * 100 if total_time > 0 else 0
-    df.attrs['not_front_camera_percentage'] = (total_not_front_time / total_time) * 100 if total_time > 0 else 0
+    stride = analysis_stride(video_fps, analysis_fps)
+
+    # Split the video into contiguous segments of at least MIN_SEGMENT_SECONDS, one per worker
+    workers = workers or config.ANALYSIS_WORKERS
+    if frame_count > 0 and video_fps > 0:
+        workers = max(1, min(workers, int(frame_count / (video_fps * MIN_SEGMENT_SECONDS))))
+    else:
+        workers = 1
+    if workers == 1:
+        frames_done = 0
+
+        def count_frames(frames):
+            nonlocal frames_done
+            frames_done += frames
+            if frame_count > 0:
+                progress(min(1.0, frames_done / frame_count))
+
+        signals = analyze_segment(video_path, 0, None, stride, count_frames if progress else None, config.INFERENCE_WIDTH)
+        if progress:
+            progress(1.0)  # The frame count is an estimate and may not have been reached
+        return signals
+
+    bounds = np.linspace(0, frame_count, workers + 1).astype(int).tolist()
+    starts, ends = bounds[:-1], bounds[1:]
+    ends[-1] = None  # The frame count is an estimate, let the last segment run to the real end
+    # Spawned workers don't inherit MediaPipe graphs or threads from the Streamlit process
+    context = multiprocessing.get_context("spawn")
+    frames_done = context.Value('q', 0)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_segment_worker,
+                             initargs=(frames_done, vars(config))) as executor:
+        futures = [
+            executor.submit(_analyze_segment_in_worker, video_path, start, end, stride,
+                            _count_segment_frames if progress else None, config.INFERENCE_WIDTH)
+            for start, end in zip(starts, ends)
+        ]
+        if progress:
+            while wait(futures, timeout=0.2).not_done:
+                progress(min(1.0, frames_done.value / frame_count))
+            progress(1.0)
+        segments = []
+        for future in futures:
+            signals, segment_timings = future.result()
+            segments.append(signals)
+            timings.merge(segment_timings)
+        return concatenate(segments)
+
+def process_uploaded_video(video_path, analysis_fps=None, workers=None, progress=None, video_digest=None):
+    # With the video's content hash, signals are read from and stored in the on-disk cache
+    analysis_fps = analysis_fps or config.ANALYSIS_FPS
+    cache_key = None
+    if video_digest and config.SIGNAL_CACHE_MAX_BYTES > 0:
+        cache_key = signal_cache.cache_key(video_digest, {'analysis_fps': analysis_fps, 'face_mesh': FACE_MESH_SETTINGS,
+                                                          'inference_width': config.INFERENCE_WIDTH,
+                                                          'motion_gate': [config.MOTION_GATE_ENABLED, config.MOTION_PIXEL_DELTA,
+                                                                          config.MOTION_CHANGED_FRACTION, config.MOTION_MAX_REUSE]})
+
+    signals = signal_cache.load(cache_key) if cache_key else None
+    if signals is None:
+        signals = extract_video_signals(video_path, analysis_fps, workers, progress)
+        if cache_key:
+            signal_cache.store(cache_key, signals)
+    elif progress:
+        progress(1.0)
+
+    timestamps = signals['timestamp']
+    eye_codes = signals['eye_direction']
+    face_codes = signals['face_position']
+
+    # Scoring runs once over the merged signals, in timestamp order, so the focus score
+    # and look timers carry across segment boundaries
+    with timings.stage("score"):
+        focus_scores = score_signals(timestamps, face_codes, eye_codes, signals['blink_ratio'])
+
+    start_time = timestamps[0] if len(timestamps) else 0
+    df = pd.DataFrame({
+        'timestamp': timestamps,
+        'focus_score': focus_scores,
+        'eye_direction': pd.Categorical.from_codes(eye_codes, categories=EYE_DIRECTIONS),
+        'face_position': pd.Categorical.from_codes(face_codes, categories=FACE_POSITIONS),
+        'is_front_camera': face_codes != FACE_POSITION_CODES["Not Detected"],
+        'blink_ratio': signals['blink_ratio'],  # Kept so the results can be re-scored
+    })
+    df['timestamp_min'] = (df['timestamp'] - start_time) / 60  # Convert to minutes
+
+    # Calculate delta_time from the real timestamps, so each analysed frame also
+    # carries the time of the frames skipped before it
+    df['delta_time'] = df['timestamp'].diff().fillna(0)
 
-    return df
\ No newline at end of file
+    # Report statistics are accumulated once here instead of re-derived from the DataFrame
+    summary = SessionSummary()
+    summary.update_many(timestamps, eye_codes, face_codes, focus_scores)
+    df.attrs['summary'] = summary
+    df.attrs['front_camera_percentage'], df.attrs['not_front_camera_percentage'] = summary.front_camera_shares()
+    df.attrs['result_id'] = uuid.uuid4().hex  # Identifies these scores for memoized dashboard views
+    # FaceMesh runs against frames that reused the previous signals (the motion gate's savings)
+    df.attrs['frames_inferred'] = int(np.count_nonzero(signals['inferred']))
+    df.attrs['frames_reused'] = len(timestamps) - df.attrs['frames_inferred']
+
+    return df
+
+
+def rescore_results(df):
+    # Re-score an analysis in place from its stored signals with the current thresholds,
+    # without touching the video again
+    df['focus_score'] = score_signals(
+        df['timestamp'].to_numpy(),
+        df['face_position'].cat.codes.to_numpy(),
+        df['eye_direction'].cat.codes.to_numpy(),
+        df['blink_ratio'].to_numpy(),
+    )
+    summary = df.attrs['summary']
+    summary.reset_scores()
+    summary.add_scores(df['focus_score'].to_numpy())
+    df.attrs['result_id'] = uuid.uuid4().hex
+    return df
@@ -0,0 +1,46 @@
+import numpy as np
+
+
+class ColumnBuffer:
+    # Growable set of equally long NumPy columns. Rows are appended one at a time
+    # into preallocated arrays, which double in size when full, so per-frame results
+    # never exist as Python objects.
+    def __init__(self, dtypes, capacity=4096):
+        self.size = 0
+        self.columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in dtypes.items()}
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, rows):
+        capacity = len(next(iter(self.columns.values())))
+        if self.size + rows <= capacity:
+            return
+        while capacity < self.size + rows:
+            capacity *= 2
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def append(self, *values):
+        self._reserve(1)
+        for column, value in zip(self.columns.values(), values):
+            column[self.size] = value
+        self.size += 1
+
+    def extend(self, *values):
+        # Append several rows at once, one array (or scalar) per column
+        rows = max(np.size(value) for value in values)
+        self._reserve(rows)
+        for column, value in zip(self.columns.values(), values):
+            column[self.size:self.size + rows] = value
+        self.size += rows
+
+    def arrays(self):
+        return {name: column[:self.size] for name, column in self.columns.items()}
+
+
+def concatenate(chunks):
+    # Join the arrays() of several buffers with the same columns, in order
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
@@ -0,0 +1,112 @@
+import cv2 as cv
+import numpy as np
+
+POSE_ITERATIONS = 10  # Most Gauss-Newton steps taken; from the warm start three are enough
+NO_DISTORTION = np.zeros((4, 1))
+
+
+def camera_intrinsics(frame_width, frame_height):
+    # Same pinhole camera analyze_frame gives solvePnP: focal length = frame width
+    return float(frame_width), frame_width / 2, frame_height / 2
+
+
+def rotation_from_vectors(rotation_vectors):
+    # Batched Rodrigues formula: (F, 3) rotation vectors -> (F, 3, 3) matrices
+    x, y, z = rotation_vectors.T
+    k = np.zeros((len(rotation_vectors), 3, 3))
+    k[:, 0, 1], k[:, 0, 2], k[:, 1, 2] = -z, y, -x
+    k[:, 1, 0], k[:, 2, 0], k[:, 2, 1] = z, -y, x
+    theta = np.sqrt(x * x + y * y + z * z)
+    small = theta < 1e-8
+    theta = np.where(small, 1.0, theta)
+    a = np.where(small, 1.0, np.sin(theta) / theta)[:, None, None]
+    b = np.where(small, 0.5, (1 - np.cos(theta)) / theta ** 2)[:, None, None]
+    return np.eye(3) + a * k + b * (k @ k)
+
+
+def solve_head_pose(object_points, image_points, frame_width, frame_height):
+    # Least-squares pose of every face at once: (F, N, 3) model points and (F, N, 2) pixel
+    # points -> (F, 3, 3) rotations. Minimizes the same reprojection error as cv.solvePnP
+    # with the analyze_frame camera and no distortion. The model points are the pixel
+    # landmarks themselves, so the pose is always close to R = I, t = (-cx, -cy, f),
+    # which is where the Gauss-Newton iterations start.
+    focal, cx, cy = camera_intrinsics(frame_width, frame_height)
+    faces, points = object_points.shape[:2]
+    rotation = np.broadcast_to(np.eye(3), (faces, 3, 3)).copy()
+    translation = np.tile([-cx, -cy, focal], (faces, 1))
+    target = np.concatenate([image_points[..., 0] - cx, image_points[..., 1] - cy], -1)
+    jacobian = np.zeros((faces, 2 * points, 6))
+    ju, jv = jacobian[:, :points], jacobian[:, points:]
+
+    for _ in range(POSE_ITERATIONS):
+        rotated = object_points @ rotation.transpose(0, 2, 1)
+        rx, ry, rz = rotated.transpose(2, 0, 1)
+        z = rz + translation[:, 2:]
+        a = focal / z
+        u = a * (rx + translation[:, :1])
+        v = a * (ry + translation[:, 1:2])
+        residuals = np.concatenate([u, v], -1) - target
+
+        # Jacobian of the projection for a rotation step R <- exp([d]x) R and a translation step
+        bu = u / z
+        bv = v / z
+        ju[..., 0], ju[..., 1], ju[..., 2] = -bu * ry, a * rz + bu * rx, -a * ry
+        ju[..., 3], ju[..., 5] = a, -bu
+        jv[..., 0], jv[..., 1], jv[..., 2] = -a * rz - bv * ry, bv * rx, a * rx
+        jv[..., 4], jv[..., 5] = a, -bv
+
+        jt = jacobian.transpose(0, 2, 1)
+        step = np.linalg.solve(jt @ jacobian, -(jt @ residuals[..., None]))[..., 0]
+        rotation = rotation_from_vectors(step[:, :3]) @ rotation
+        translation += step[:, 3:]
+        if np.abs(step[:, :3]).max() < 1e-9:
+            break
+    return rotation
+
+
+def rotation_angles(rotation):
+    # The x and y angles cv.RQDecomp3x3 gives for (F, 3, 3) rotations, as (F, 2) degrees.
+    # Its first two Givens rotations reduce to these arctangents, so no decomposition is needed.
+    r21, r22 = rotation[:, 2, 1], rotation[:, 2, 2]
+    return np.degrees(np.stack([np.arctan2(r21, r22), np.arctan2(-rotation[:, 2, 0], np.hypot(r21, r22))], -1))
+
+
+def pitch_yaw(rotation):
+    # rotation_angles of one rotation matrix, as (pitch, yaw) floats
+    pitch, yaw = rotation_angles(rotation[None])[0].tolist()
+    return pitch, yaw
+
+
+class HeadPoseEstimator:
+    # Head pose of the face in one stream of frames, solved the way analyze_frame always
+    # did (cv.solvePnP on the pose landmarks, focal length = frame width) but cheaper:
+    # the camera matrix is built once per frame size, and each solve starts from the
+    # previous frame's pose (useExtrinsicGuess), which takes far fewer iterations than
+    # starting from scratch. Call reset() when the face is lost.
+    def __init__(self):
+        self.frame_size = None
+        self.camera_matrix = None
+        self.rotation = None
+        self.translation = None
+
+    def reset(self):
+        self.rotation = self.translation = None
+
+    def angles(self, object_points, image_points, frame_width, frame_height):
+        # (pitch, yaw) in degrees
+        if self.frame_size != (frame_width, frame_height):
+            focal, cx, cy = camera_intrinsics(frame_width, frame_height)
+            self.camera_matrix = np.array([[focal, 0, cx], [0, focal, cy], [0, 0, 1]])
+            self.frame_size = (frame_width, frame_height)
+            self.reset()
+
+        if self.rotation is None:
+            success, rotation, translation = cv.solvePnP(object_points, image_points, self.camera_matrix, NO_DISTORTION)
+        else:
+            success, rotation, translation = cv.solvePnP(object_points, image_points, self.camera_matrix, NO_DISTORTION,
+                                                         self.rotation, self.translation, useExtrinsicGuess=True)
+        if success:
+            self.rotation, self.translation = rotation, translation
+        else:
+            self.reset()
+        return pitch_yaw(cv.Rodrigues(rotation)[0])
@@ -1,89 +1,119 @@
+import html
+import json
+import os
+import re
+import threading
+
+import numpy as np
 from bs4 import BeautifulSoup
 
-def replace_placeholders(script_content: str, placeholder_mapping: dict) -> str:
-    for placeholder, value in placeholder_mapping.items():
-        script_content = script_content.replace(placeholder, str(value))
-    return script_content
+from constants import config
+from downsample import lttb
+import timings
+
+# Template placeholders filled with chart data, as (chart, field) in chart_data
+CHART_PLACEHOLDERS = {
+    "__LABELS_LINECHART__": ("line_chart", "labels"),
+    "__DATA_LINECHART__": ("line_chart", "data"),
+    "__LABELS_PIECHART1__": ("pie_chart1", "labels"),
+    "__DATA_PIECHART1__": ("pie_chart1", "data"),
+    "__LABELS_PIECHART2__": ("pie_chart2", "labels"),
+    "__DATA_PIECHART2__": ("pie_chart2", "data"),
+    "__LABELS_PIECHART3__": ("pie_chart3", "labels"),
+    "__DATA_PIECHART3__": ("pie_chart3", "data"),
+}
+# Score card titles in the template and the key of their value in scores
+SCORE_CARDS = {
+    "Final Score": "final",
+    "Max Score": "highest_continuous",
+    "Min score": "min",
+    "Score after quiz": "after_quiz",
+}
+TABLE_ROWS = "__TABLE_ROWS__"
+
+TABLE_ROW = (
+    '<tr>'
+    '<td><div class="d-flex px-2 py-1 align-items"><div class="ms-4">'
+    '<p class="text-xs font-weight-bold mb-0">Question</p><h6 class="text-sm mb-0">{question}</h6>'
+    '</div></div></td>'
+    '<td><div><p class="text-xs font-weight-bold mb-0">Wrong/Correct</p><h6 class="text-sm mb-0">{status}</h6></div></td>'
+    '<td><div><p class="text-xs font-weight-bold mb-0">Score</p><h6 class="text-sm mb-0">{score}</h6></div></td>'
+    '</tr>'
+)
+
+# Compiled templates by path, with the modification time they were compiled from
+_compiled_templates = {}
+_compiled_lock = threading.Lock()
+
 
-def generate_html_from_template(template_path: str, chart_data: dict, scores: dict, table_data: list) -> str:
+def score_placeholder(key):
+    return f"__SCORE_{key.upper()}__"
+
+
+def compile_template(template_path: str) -> list:
+    # Parse the template once and split it into literal HTML and named slots: even
+    # items are literal, odd items are placeholders filled in at render time
     with open(template_path, "r", encoding="utf-8") as file:
         soup = BeautifulSoup(file, "html.parser")
 
-    # Replace placeholders in the script tag
-    script_tag = soup.find("script", text=lambda x: x and "__LABELS_LINECHART__" in x)
-    if script_tag and script_tag.string:
-        placeholder_mapping = {
-            "__LABELS_LINECHART__": chart_data["line_chart"]["labels"],
-            "__DATA_LINECHART__": chart_data["line_chart"]["data"],
-            "__LABELS_PIECHART1__": chart_data["pie_chart1"]["labels"],
-            "__DATA_PIECHART1__": chart_data["pie_chart1"]["data"],
-            "__LABELS_PIECHART2__": chart_data["pie_chart2"]["labels"],
-            "__DATA_PIECHART2__": chart_data["pie_chart2"]["data"],
-            "__LABELS_PIECHART3__": chart_data["pie_chart3"]["labels"],
-            "__DATA_PIECHART3__": chart_data["pie_chart3"]["data"],
-        }
-        updated_script_content = replace_placeholders(script_tag.string, placeholder_mapping)
-        script_tag.string = updated_script_content
-
-    # Update score cards
-    score_cards = {
-        "Final Score": scores["final"],
-        "Max Score": scores["highest_continuous"],
-        "Min score": scores["min"],
-        "Score after quiz": scores["after_quiz"],
-    }
-    for card_title, score_value in score_cards.items():
+    for card_title, key in SCORE_CARDS.items():
         card = soup.find("h5", text=card_title)
         if card:
             score_span = card.find_next("span", {"class": "h2 font-weight-bold mb-0"})
             if score_span:
-                score_span.string = str(score_value)
+                score_span.string = score_placeholder(key)
 
-    # Populate quiz results table
     table_body = soup.find("tbody")
     if table_body:
         table_body.clear()
-        for row in table_data:
-            new_row = soup.new_tag("tr")
-
-            # Question cell
-            question_cell = soup.new_tag("td")
-            question_div = soup.new_tag("div", attrs={"class": "d-flex px-2 py-1 align-items"})
-            question_inner_div = soup.new_tag("div", attrs={"class": "ms-4"})
-            question_p = soup.new_tag("p", attrs={"class": "text-xs font-weight-bold mb-0"})
-            question_p.string = "Question"
-            question_h6 = soup.new_tag("h6", attrs={"class": "text-sm mb-0"})
-            question_h6.string = row["question"]
-            question_inner_div.append(question_p)
-            question_inner_div.append(question_h6)
-            question_div.append(question_inner_div)
-            question_cell.append(question_div)
-            new_row.append(question_cell)
-
-            # Status cell
-            status_cell = soup.new_tag("td")
-            status_div = soup.new_tag("div")
-            status_p = soup.new_tag("p", attrs={"class": "text-xs font-weight-bold mb-0"})
-            status_p.string = "Wrong/Correct"
-            status_h6 = soup.new_tag("h6", attrs={"class": "text-sm mb-0"})
-            status_h6.string = row["status"]
-            status_div.append(status_p)
-            status_div.append(status_h6)
-            status_cell.append(status_div)
-            new_row.append(status_cell)
-
-            # Score cell
-            score_cell = soup.new_tag("td")
-            score_div = soup.new_tag("div")
-            score_p = soup.new_tag("p", attrs={"class": "text-xs font-weight-bold mb-0"})
-            score_p.string = "Score"
-            score_h6 = soup.new_tag("h6", attrs={"class": "text-sm mb-0"})
-            score_h6.string = row["score"]
-            score_div.append(score_p)
-            score_div.append(score_h6)
-            score_cell.append(score_div)
-            new_row.append(score_cell)
-
-            table_body.append(new_row)
-
-    return str(soup)
\ No newline at end of file
+        table_body.append(TABLE_ROWS)
+
+    placeholders = list(CHART_PLACEHOLDERS) + [score_placeholder(key) for key in SCORE_CARDS.values()] + [TABLE_ROWS]
+    return re.split("(" + "|".join(map(re.escape, placeholders)) + ")", str(soup))
+
+
+def get_compiled_template(template_path: str) -> list:
+    mtime = os.path.getmtime(template_path)
+    with _compiled_lock:
+        compiled = _compiled_templates.get(template_path)
+        if compiled is None or compiled[0] != mtime:
+            compiled = (mtime, compile_template(template_path))
+            _compiled_templates[template_path] = compiled
+    return compiled[1]
+
+
+def to_script_json(value) -> str:
+    # Compact JSON that is safe inside a <script> element
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    return json.dumps(value, separators=(",", ":")).replace("</", "<\\/")
+
+
+def downsample_line_chart(line_chart: dict, max_points: int) -> dict:
+    # Reduce the focus line to at most max_points points, keeping its shape
+    labels = np.asarray(line_chart["labels"], dtype=np.float64)
+    data = np.asarray(line_chart["data"], dtype=np.float64)
+    if max_points:
+        indices = lttb(labels, data, max_points)
+        labels, data = labels[indices], data[indices]
+    return {"labels": np.round(labels, 2), "data": np.round(data, 2)}
+
+
+def generate_html_from_template(template_path: str, chart_data: dict, scores: dict, table_data: list, max_points: int = None) -> str:
+    with timings.stage("report"):
+        parts = get_compiled_template(template_path)
+        max_points = config.REPORT_MAX_POINTS if max_points is None else max_points
+        chart_data = dict(chart_data, line_chart=downsample_line_chart(chart_data["line_chart"], max_points))
+
+        values = {
+            placeholder: to_script_json(chart_data[chart][field])
+            for placeholder, (chart, field) in CHART_PLACEHOLDERS.items()
+        }
+        for key in SCORE_CARDS.values():
+            values[score_placeholder(key)] = html.escape(str(scores[key]), quote=False)
+        values[TABLE_ROWS] = "".join(
+            TABLE_ROW.format(**{field: html.escape(str(row[field]), quote=False) for field in ("question", "status", "score")})
+            for row in table_data
+        )
+
+        return "".join(values[part] if i % 2 else part for i, part in enumerate(parts))
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+UPLOAD_DIR = os.path.join(tempfile.gettempdir(), "focus_analyzer_uploads")
+CHUNK_SIZE = 1024 * 1024  # Spool uploads to disk 1 MiB at a time
+STALE_UPLOAD_AGE = 6 * 3600  # Seconds after which a file no holder owns counts as left behind
+
+# Reference counts of the ingested files, keyed by path. A file is removed when
+# its last holder releases it.
+_ref_counts = {}
+_lock = threading.Lock()
+_swept = False
+
+
+class IngestedVideo:
+    # A content-addressed copy of an upload on disk, shared by every pipeline that
+    # reads the same video. Each holder calls release() (or uses it as a context
+    # manager) once it is done with the file.
+    def __init__(self, path, digest):
+        self.path = path
+        self.digest = digest
+
+    def acquire(self):
+        with _lock:
+            _ref_counts[self.path] += 1
+        return self
+
+    def release(self):
+        with _lock:
+            _ref_counts[self.path] -= 1
+            if _ref_counts[self.path] > 0:
+                return
+            del _ref_counts[self.path]
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+def ingest_upload(video_file):
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    extension = os.path.splitext(getattr(video_file, "name", ""))[1].lower()
+
+    # Hash while spooling, so the upload is read once and never held in memory as a whole
+    sha256 = hashlib.sha256()
+    video_file.seek(0)
+    fd, partial_path = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: video_file.read(CHUNK_SIZE), b""):
+                sha256.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(partial_path)
+        raise
+    finally:
+        video_file.seek(0)
+
+    digest = sha256.hexdigest()
+    path = os.path.join(UPLOAD_DIR, digest + extension)
+    with _lock:
+        if path in _ref_counts:
+            # Same content is already on disk for another holder
+            os.remove(partial_path)
+        else:
+            os.replace(partial_path, path)
+        _ref_counts[path] = _ref_counts.get(path, 0) + 1
+    return IngestedVideo(path, digest)
+
+
+def sweep_stale_uploads():
+    # Once per process: remove files an earlier server run left in UPLOAD_DIR when it was
+    # killed mid-analysis. Files held here are kept, and so are recent ones, which may
+    # belong to another server process sharing the folder.
+    global _swept
+    with _lock:
+        if _swept:
+            return
+        _swept = True
+        held = set(_ref_counts)
+    if not os.path.isdir(UPLOAD_DIR):
+        return
+    cutoff = time.time() - STALE_UPLOAD_AGE
+    for entry in os.scandir(UPLOAD_DIR):
+        try:
+            if entry.is_file() and entry.path not in held and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass  # Removed by another process in the meantime
+
+
+def file_digest(path):
+    # SHA-256 of a video already on disk, matching the digest ingest_upload gives its upload
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
@@ -0,0 +1,240 @@
+import atexit
+import itertools
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import focus_detection as fd
+import timings
+from constants import config
+
+# Live WebRTC sessions analysed in a pool of worker processes rather than in the
+# Streamlit server process, so concurrent streams spread over every core instead of
+# contending for one GIL. A session is pinned to the worker with the fewest open
+# sessions when it opens, since FaceMesh tracking, the head pose and the motion gate
+# carry state from frame to frame; that state lives in the worker under the session's
+# id and is dropped when the session closes. Scoring stays with the session's own
+# FocusVideoProcessor, so no two streams share any state. Frames are not pickled: each
+# session copies its frame into a shared memory block of its own, and only the block's
+# name, the frame shape and the timestamp travel through the worker's queue. A worker
+# that dies fails the frames it still owed at once and is replaced by a fresh one.
+
+WORKER_CHECK_INTERVAL = 0.5  # Seconds between liveness checks while a frame is awaited
+
+
+class _WorkerSession:
+    # A session's analysis state inside a worker process
+    def __init__(self):
+        self.face_mesh = fd.create_face_mesh()
+        self.head_pose = fd.HeadPoseEstimator()
+        self.motion_gate = fd.MotionGate()
+        self.block = None
+
+    def frame(self, block_name, shape):
+        # The session's latest frame, read in place from its shared memory block
+        if self.block is None or self.block.name != block_name:
+            if self.block is not None:
+                self.block.close()
+            self.block = shared_memory.SharedMemory(name=block_name)
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.block.buf)
+
+    def close(self):
+        self.face_mesh.close()
+        if self.block is not None:
+            self.block.close()
+
+
+def _serve(requests, results, settings):
+    # Main loop of a worker process: ("frame", session, request, block, shape, timestamp,
+    # timings enabled) messages are answered on `results`, ("close", session) ends a session
+    vars(config).update(settings)  # The server's configuration as it was when the pool started
+    sessions = {}
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        if message[0] == "close":
+            session = sessions.pop(message[1], None)
+            if session is not None:
+                session.close()
+            continue
+
+        _, session_id, request_id, block_name, shape, timestamp, timings_enabled = message
+        config.TIMINGS_ENABLED = timings_enabled
+        try:
+            session = sessions.get(session_id)
+            if session is None:
+                session = sessions[session_id] = _WorkerSession()
+            # Full resolution and before the flip, as the in-process live path analyses it
+            signals = fd.analyze_frame_offline(session.frame(block_name, shape), session.face_mesh, 0,
+                                               session.head_pose, session.motion_gate, timestamp)
+            results.put((request_id, (signals, session.motion_gate.reused), timings.drain()))
+        except Exception as e:
+            results.put((request_id, e, timings.drain()))
+    for session in sessions.values():
+        session.close()
+
+
+class LiveSession:
+    # One stream's handle on its worker. analyze() is called by one thread at a time.
+    def __init__(self, manager, worker, session_id):
+        self.manager = manager
+        self.worker = worker
+        self.session_id = session_id
+        self.block = None
+        self.reused = False  # Whether the worker's motion gate answered the last frame without FaceMesh
+
+    def analyze(self, frame, timestamp):
+        # FrameSignals of a BGR frame, analysed in the worker
+        if self.block is None or self.block.size < frame.nbytes:
+            self._release_block()
+            self.block = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+        np.ndarray(frame.shape, dtype=np.uint8, buffer=self.block.buf)[:] = frame
+        future = self.manager.submit(self, self.block.name, frame.shape, timestamp, config.TIMINGS_ENABLED)
+        signals, self.reused = self.manager.wait(future)
+        return signals
+
+    def _release_block(self):
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+    def close(self):
+        self.manager.close_session(self)
+        self._release_block()
+
+
+class LiveSessionManager:
+    # Worker processes are started with the first session and shared by all that follow
+    def __init__(self, workers):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.requests = []  # One queue per worker
+        self.processes = []
+        self.loads = []  # Open sessions per worker
+        self.sessions = set()
+        self.context = multiprocessing.get_context("spawn")
+        self.results = None
+        self.collector = None
+        self.pending = {}  # Request id -> (Future, worker)
+        self.ids = itertools.count()
+
+    def _start_worker(self, worker):
+        # Spawn context, for the reason given in focus_detection.extract_video_signals
+        requests = self.context.Queue()
+        process = self.context.Process(target=_serve, args=(requests, self.results, vars(config)), daemon=True)
+        process.start()
+        self.requests[worker] = requests
+        self.processes[worker] = process
+
+    def _start(self):
+        self.results = self.context.Queue()
+        self.requests = [None] * self.workers
+        self.processes = [None] * self.workers
+        self.loads = [0] * self.workers
+        for worker in range(self.workers):
+            self._start_worker(worker)
+        self.collector = threading.Thread(target=self._collect, daemon=True)
+        self.collector.start()
+
+    def _replace_dead_workers(self):
+        # Called with the lock held. Sessions pinned to a dead worker keep their slot in
+        # `loads` until they close; their next frames start afresh in the new worker.
+        for worker, process in enumerate(self.processes):
+            if process.is_alive():
+                continue
+            error = RuntimeError(f"live worker {worker} exited with code {process.exitcode}")
+            for request_id, (future, owner) in list(self.pending.items()):
+                if owner == worker:
+                    del self.pending[request_id]
+                    future.set_exception(error)
+            self._start_worker(worker)
+
+    def _collect(self):
+        # Hand each worker reply to the Future of its request
+        while True:
+            message = self.results.get()
+            if message is None:
+                return
+            request_id, outcome, worker_timings = message
+            with self.lock:
+                future, _ = self.pending.pop(request_id, (None, None))
+            timings.merge(worker_timings)
+            if future is None:
+                continue  # Already failed when its worker was found dead
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    def open_session(self):
+        with self.lock:
+            if not self.processes:
+                self._start()
+            self._replace_dead_workers()
+            worker = int(np.argmin(self.loads))
+            self.loads[worker] += 1
+            session = LiveSession(self, worker, next(self.ids))
+            self.sessions.add(session)
+        return session
+
+    def submit(self, session, *frame):
+        # Queue a frame message for the session's worker; the Future gets its reply
+        future = Future()
+        with self.lock:
+            request_id = next(self.ids)
+            self.pending[request_id] = (future, session.worker)
+            requests = self.requests[session.worker]
+        requests.put(("frame", session.session_id, request_id) + frame)
+        return future
+
+    def wait(self, future):
+        # A frame's reply. Raises the worker's error, a RuntimeError as soon as the worker
+        # is found dead, or concurrent.futures.TimeoutError after LIVE_WORKER_TIMEOUT seconds.
+        deadline = time.monotonic() + config.LIVE_WORKER_TIMEOUT
+        while True:
+            try:
+                return future.result(timeout=max(0.0, min(WORKER_CHECK_INTERVAL, deadline - time.monotonic())))
+            except FutureTimeoutError:
+                if time.monotonic() >= deadline:
+                    raise
+                with self.lock:
+                    self._replace_dead_workers()
+
+    def close_session(self, session):
+        with self.lock:
+            if session not in self.sessions:
+                return
+            self.sessions.remove(session)
+            self.loads[session.worker] -= 1
+        self.requests[session.worker].put(("close", session.session_id))
+
+    def close(self):
+        for session in list(self.sessions):
+            session.close()
+        for requests in self.requests:
+            requests.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+        if self.collector is not None:
+            self.results.put(None)
+            self.collector.join()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_session_manager():
+    # The server's manager, or None when LIVE_WORKERS is 0 and streams are analysed in process
+    global _manager
+    with _manager_lock:
+        if _manager is None and config.LIVE_WORKERS > 0:
+            _manager = LiveSessionManager(config.LIVE_WORKERS)
+            atexit.register(_manager.close)
+        return _manager
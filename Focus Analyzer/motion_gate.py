@@ -0,0 +1,80 @@
+import cv2 as cv
+import numpy as np
+
+from constants import config
+
+# Change detector that lets a stream skip FaceMesh on frames where nothing moved. Each
+# analysed frame leaves small grey thumbnails of the regions around the face it found,
+# the whole face and the eyes, whose gaze and blinks would barely show at face scale
+# (or of the whole frame when there was no face). A later frame whose thumbnails of the
+# same regions each differ in at most MOTION_CHANGED_FRACTION of the pixels, by more
+# than MOTION_PIXEL_DELTA grey levels, reuses the analysed frame's signals. Frames are
+# compared with the last analysed frame rather than the previous one, so slow drift
+# still adds up to a change, and FaceMesh runs again after MOTION_MAX_REUSE seconds
+# however still the view is. The first frame analysed after a change is never reused:
+# FaceMesh's landmark tracking takes one more frame to catch up with a sudden move.
+
+THUMBNAIL_SIZE = 32
+BOX_MARGIN = 0.25  # Share of a box added on each side, so a face leaving it is noticed
+
+
+class MotionGate:
+    def __init__(self):
+        self.regions = [None]  # (x0, y0, x1, y1) compared between frames, None for the whole frame
+        self.thumbnails = None
+        self.signals = None
+        self.timestamp = None
+        self.moved = True  # Whether the last frame looked different from the analysed one
+        self.settled = False  # Whether the analysed frame's signals may be reused
+        self.reused = False  # Whether the last frame reused signals instead of being analysed
+        self.inferred = 0
+        self.skipped = 0
+
+    @staticmethod
+    def _thumbnail(frame, region):
+        if region is not None:
+            x0, y0, x1, y1 = region
+            frame = frame[y0:y1, x0:x1]
+        # A linear resize to four times the size and an area resize from there cost the
+        # same at any resolution, unlike one area resize, and average away codec noise
+        frame = cv.resize(frame, (4 * THUMBNAIL_SIZE, 4 * THUMBNAIL_SIZE), interpolation=cv.INTER_LINEAR)
+        frame = cv.resize(frame, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv.INTER_AREA)
+        return cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+
+    def _moved(self, frame):
+        for region, thumbnail in zip(self.regions, self.thumbnails):
+            changed = cv.absdiff(self._thumbnail(frame, region), thumbnail) > config.MOTION_PIXEL_DELTA
+            if np.count_nonzero(changed) > config.MOTION_CHANGED_FRACTION * changed.size:
+                return True
+        return False
+
+    def reuse(self, frame, timestamp):
+        # The last analysed frame's signals if this frame looks the same, otherwise None
+        self.reused = False
+        if not config.MOTION_GATE_ENABLED or self.signals is None:
+            self.moved = True
+            return None
+        self.moved = self._moved(frame)
+        if self.moved or not self.settled or not 0 <= timestamp - self.timestamp < config.MOTION_MAX_REUSE:
+            return None
+        self.reused = True
+        self.skipped += 1
+        return self.signals
+
+    def update(self, frame, timestamp, signals, boxes=()):
+        # Record a frame FaceMesh analysed; `boxes` are (x0, y0, x1, y1) in its pixels
+        height, width = frame.shape[:2]
+        self.regions = []
+        for x0, y0, x1, y1 in boxes:
+            margin_x, margin_y = (x1 - x0) * BOX_MARGIN, (y1 - y0) * BOX_MARGIN
+            x0, y0 = max(0, int(x0 - margin_x)), max(0, int(y0 - margin_y))
+            x1, y1 = min(width, int(x1 + margin_x) + 1), min(height, int(y1 + margin_y) + 1)
+            if x1 > x0 and y1 > y0:
+                self.regions.append((x0, y0, x1, y1))
+        if not self.regions:
+            self.regions = [None]
+        self.thumbnails = [self._thumbnail(frame, region) for region in self.regions]
+        self.signals = signals
+        self.timestamp = timestamp
+        self.settled = not self.moved
+        self.inferred += 1
@@ -1,55 +1,78 @@
-import openai
-import json
 import subprocess
-import os
+import threading
+import numpy as np
 import whisper
 import streamlit as st
+from constants import config
+import quiz_service
+import timings
+
+AUDIO_SAMPLE_RATE = 16000  # Sample rate Whisper expects
+
+# Whisper models loaded in this process, by model name. Every caller shares them,
+# so the weights are read from disk once per server rather than once per quiz.
+_whisper_models = {}
+_whisper_lock = threading.Lock()
+_warm_up_thread = None
+
+def get_whisper_model(name=None):
+    name = name or config.WHISPER_MODEL
+    model = _whisper_models.get(name)
+    if model is None:
+        with _whisper_lock:
+            model = _whisper_models.get(name)
+            if model is None:
+                model = whisper.load_model(name)
+                _whisper_models[name] = model
+    return model
+
+def warm_up_whisper_model(name=None):
+    # Load the model in the background so the first transcription doesn't wait for it
+    global _warm_up_thread
+    with _whisper_lock:
+        if _warm_up_thread is not None or (name or config.WHISPER_MODEL) in _whisper_models:
+            return
+        _warm_up_thread = threading.Thread(target=get_whisper_model, args=(name,), daemon=True)
+    _warm_up_thread.start()
 
 def generate_quiz_from_text(text):
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": """Generate a multiple choice quiz as JSON with this exact structure: 
-                 {"questions": [{"question": "Q1?", "options": ["A", "B", "C"], "correct_answer": "A"}]}.
-                 Make questions short, general, simple, clear, easy, and focus on main points and key takeaways from the content, Make sure questions and multiple choices are as short as possible.
-                 Ensure questions are straightforward and test understanding rather than specific details.
-                 Include some questions about the overall theme or main message."""},
-                {"role": "user", "content": f"Create a 5-question quiz covering the main points and general understanding of this text:\n\n{text}"}
-            ]
-        )
-        quiz_data = json.loads(response.choices[0].message['content'])
-        if not isinstance(quiz_data, dict) or 'questions' not in quiz_data:
-            raise ValueError("Invalid quiz format")
-        return quiz_data
+        return quiz_service.get_quiz_service().get_quiz(text)
     except Exception as e:
         st.error(f"Error generating quiz: {e}")
         return None
 
-def process_video_to_text(video_file):
-    temp_dir = "temp"
-    os.makedirs(temp_dir, exist_ok=True)
-    
-    temp_video_path = os.path.join(temp_dir, video_file.name)
-    audio_file_path = os.path.join(temp_dir, 'output_audio.mp3')
-    
+def extract_audio(video_path):
+    # Decode the audio track to 16 kHz mono float32 PCM and read it straight from
+    # ffmpeg's stdout, so no audio file is ever written or shared between sessions
+    command = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-i", video_path,
+        "-vn", "-ac", "1", "-ar", str(AUDIO_SAMPLE_RATE), "-f", "f32le", "-",
+    ]
+    # capture_output drains stdout and stderr together, so a noisy ffmpeg can't fill
+    # the stderr pipe and stall while we're still reading the audio
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, command, stderr=result.stderr)
+    return np.frombuffer(bytearray(result.stdout), dtype=np.float32)  # Writable, unlike a view of bytes
+
+def process_video_to_text(video_path, progress=None):
+    # `progress`, if given, is called with the fraction of the work done after each stage
     try:
-        with open(temp_video_path, "wb") as f:
-            f.write(video_file.getbuffer())
-        
-        command = ["ffmpeg", "-i", temp_video_path, "-vn", "-acodec", "libmp3lame", audio_file_path]
-        subprocess.run(command, check=True)
-        
-        result = whisper.load_model("base").transcribe(audio_file_path)
+        with timings.stage("extract_audio"):
+            audio = extract_audio(video_path)
+        if progress:
+            progress(0.2)
+
+        model = get_whisper_model()
+        with timings.stage("transcribe"):
+            result = model.transcribe(audio)
+        if progress:
+            progress(1.0)
         return result['text']
     except Exception as e:
         st.error(f"Error processing video: {e}")
         return None
-    finally:
-        if os.path.exists(temp_video_path):
-            os.remove(temp_video_path)
-        if os.path.exists(audio_file_path):
-            os.remove(audio_file_path)
 
 def display_quiz(quiz):
     st.subheader("Quiz")
@@ -94,4 +117,7 @@ def adjust_focus_score_based_on_quiz(quiz, user_answers, focus_score):
         else:
             focus_score = max(0, focus_score - 5)
             adjustment -= 5
-    return focus_score, adjustment
\ No newline at end of file
+    return focus_score, adjustment
+
+if config.WHISPER_WARMUP:
+    warm_up_whisper_model()
@@ -0,0 +1,163 @@
+import copy
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import openai
+
+from constants import config
+
+SYSTEM_PROMPT = """Generate a multiple choice quiz as JSON with this exact structure: 
+                 {"questions": [{"question": "Q1?", "options": ["A", "B", "C"], "correct_answer": "A"}]}.
+                 Make questions short, general, simple, clear, easy, and focus on main points and key takeaways from the content, Make sure questions and multiple choices are as short as possible.
+                 Ensure questions are straightforward and test understanding rather than specific details.
+                 Include some questions about the overall theme or main message."""
+USER_PROMPT = "Create a 5-question quiz covering the main points and general understanding of this text:\n\n{text}"
+QUIZ_QUESTIONS = 5
+
+
+def parse_quiz(content):
+    quiz_data = json.loads(content)
+    if not isinstance(quiz_data, dict) or 'questions' not in quiz_data:
+        raise ValueError("Invalid quiz format")
+    return quiz_data
+
+
+class OpenAIBackend:
+    def __init__(self, model="gpt-3.5-turbo"):
+        self.model = model
+        # Errors worth another attempt; bad keys and bad requests fail straight away.
+        # ValueError covers a reply that is not a valid quiz. Looked up here rather than
+        # at import so the stub backend works whatever openai version is installed.
+        self.retryable = (openai.error.Timeout, openai.error.APIError, openai.error.APIConnectionError,
+                          openai.error.RateLimitError, openai.error.ServiceUnavailableError, ValueError)
+
+    def generate(self, text, timeout):
+        response = openai.ChatCompletion.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": USER_PROMPT.format(text=text)},
+            ],
+            request_timeout=timeout,
+        )
+        return response.choices[0].message['content']
+
+
+class StubBackend:
+    # Deterministic local backend for offline use and benchmarks: builds the quiz from
+    # words of the transcript itself after a fixed simulated latency.
+    retryable = (TimeoutError,)
+    DECOYS = ["banana", "volcano", "saxophone", "glacier", "origami", "lighthouse"]
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, text, timeout):
+        with self._lock:
+            self.calls += 1
+        if timeout is not None and self.latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Stub backend took longer than {timeout}s")
+        time.sleep(self.latency)
+
+        words = re.findall(r"[A-Za-z']{4,}", text) or ["lecture"]
+        rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+        questions = []
+        for i in range(QUIZ_QUESTIONS):
+            # One question per fifth of the transcript
+            part = words[i * len(words) // QUIZ_QUESTIONS:(i + 1) * len(words) // QUIZ_QUESTIONS] or words
+            answer = rng.choice(part)
+            options = [answer] + rng.sample(self.DECOYS, 2)
+            rng.shuffle(options)
+            questions.append({
+                "question": f"Which word was used in part {i + 1} of the lecture?",
+                "options": options,
+                "correct_answer": answer,
+            })
+        return json.dumps({"questions": questions})
+
+
+class QuizService:
+    # Quiz generation shared by every session of the server. Quizzes are cached by the
+    # transcript's hash, concurrent requests for the same transcript share one backend
+    # call, at most `max_concurrency` backend calls run at once, and failed calls are
+    # retried with exponential backoff.
+    def __init__(self, backend, cache_size=128, max_concurrency=4, timeout=30.0, retries=2, backoff=1.0):
+        self.backend = backend
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def get_quiz(self, text):
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return copy.deepcopy(self._cache[key])
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+
+        if not owner:
+            return copy.deepcopy(future.result())
+
+        try:
+            quiz = self._generate(text)
+        except Exception as e:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._cache[key] = quiz
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            del self._pending[key]
+        future.set_result(quiz)
+        return copy.deepcopy(quiz)
+
+    def _generate(self, text):
+        for attempt in range(self.retries + 1):
+            try:
+                with self._slots:
+                    content = self.backend.generate(text, self.timeout)
+                return parse_quiz(content)
+            except self.backend.retryable:
+                if attempt == self.retries:
+                    raise
+            # Full jitter keeps retries from many sessions from lining up
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_quiz_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            backend = StubBackend(config.QUIZ_STUB_LATENCY) if config.QUIZ_BACKEND == "stub" else OpenAIBackend()
+            _service = QuizService(
+                backend,
+                cache_size=config.QUIZ_CACHE_SIZE,
+                max_concurrency=config.QUIZ_MAX_CONCURRENCY,
+                timeout=config.QUIZ_TIMEOUT,
+                retries=config.QUIZ_RETRIES,
+            )
+        return _service
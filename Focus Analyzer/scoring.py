@@ -0,0 +1,111 @@
+import numpy as np
+
+from constants import config, BLINK_RATIO, EYE_DIRECTION_CODES, FACE_POSITION_CODES
+
+SCORE_STEP = 0.1  # Seconds between consecutive focus score increases/decreases
+
+# Per-frame scoring states (see signal_states); CLOSED is combined with CENTERED or AWAY
+ABSENT, CENTERED, AWAY, CLOSED = 0, 1, 2, 4
+
+
+def _due_steps(current_time, last_step_time, frame_span):
+    # How many score steps this frame accounts for. When frames are subsampled a single
+    # frame stands in for the skipped ones, so it may be credited more than one step,
+    # but never for more time than has passed since the previous scored frame.
+    if last_step_time is None:
+        return 1
+    elapsed = current_time - last_step_time
+    if elapsed < SCORE_STEP - 1e-6:
+        return 0
+    return max(1, min(int(elapsed / SCORE_STEP + 1e-6), int(frame_span / SCORE_STEP + 1e-6)))
+
+
+def signal_states(face_codes, eye_codes, blink_ratios):
+    # One scoring state per frame from the category codes of its labels and its blink ratio
+    absent = np.asarray(face_codes) == FACE_POSITION_CODES["Not Detected"]
+    centered = (np.asarray(face_codes) == FACE_POSITION_CODES["Forward"]) & (np.asarray(eye_codes) == EYE_DIRECTION_CODES["Center"])
+    closed = np.asarray(blink_ratios) > BLINK_RATIO
+    return np.where(absent, ABSENT, np.where(centered, CENTERED, AWAY) | np.where(closed, CLOSED, 0))
+
+
+class FocusScorer:
+    # Focus scoring state machine driven by media timestamps (seconds) instead of
+    # wall-clock time, so the same video always gives the same score no matter
+    # how fast it is decoded.
+    def __init__(self, focus_score=50):
+        self.focus_score = focus_score  # Initialized start focus from 50
+        self.last_look_centered_time = None
+        self.not_looking_start_time = None
+        self.blink_start_time = None
+        self.blink_detected = False
+        # Track the last time we increased or decreased the focus score
+        self.last_focus_increase_time = None
+        self.last_focus_decrease_time = None
+        self.previous_time = None
+
+    def update(self, current_time, face_position, eye_direction_text, ratio):
+        if face_position == "Not Detected":
+            state = ABSENT
+        else:
+            state = CENTERED if face_position == "Forward" and eye_direction_text == "Center" else AWAY
+            if ratio > BLINK_RATIO:
+                state |= CLOSED
+        return self.step(current_time, state)
+
+    def step(self, current_time, state):
+        # Advance to a frame in the given state (see signal_states) and return the score
+        frame_span = current_time - self.previous_time if self.previous_time is not None else SCORE_STEP
+        self.previous_time = current_time
+
+        if state == ABSENT:
+            # If no face is detected, decrease focus score by 1% every 1 second
+            steps = _due_steps(current_time, self.last_focus_decrease_time, frame_span)
+            if steps:
+                self.focus_score = max(0, self.focus_score - 0.5 * steps)
+                self.last_focus_decrease_time = current_time
+            return self.focus_score
+
+        if state & CENTERED:
+            if self.last_look_centered_time is None:
+                self.last_look_centered_time = current_time
+            self.not_looking_start_time = None
+            if current_time - self.last_look_centered_time >= config.CENTER_THRESHOLD:
+                # Increase focus score by 5% every 1 second when increasing
+                steps = _due_steps(current_time, self.last_focus_increase_time, frame_span)
+                if steps:
+                    self.focus_score = min(100, self.focus_score + 0.3 * steps)
+                    self.last_focus_increase_time = current_time
+        else:
+            self.last_look_centered_time = None
+            if self.not_looking_start_time is None:
+                self.not_looking_start_time = current_time
+            elif current_time - self.not_looking_start_time >= config.SIDE_THRESHOLD:
+                # Decrease focus score by 5% every 1 second when decreasing
+                steps = _due_steps(current_time, self.last_focus_decrease_time, frame_span)
+                if steps:
+                    self.focus_score = max(0, self.focus_score - config.DISCOUNT_SIDE * steps)
+                    self.last_focus_decrease_time = current_time
+
+        if state & CLOSED:
+            if not self.blink_detected:
+                self.blink_start_time = current_time
+                self.blink_detected = True
+            elif current_time - self.blink_start_time >= config.BLINK_THRESHOLD:
+                # Decrease focus score by 20% if eyes are closed for 5 seconds
+                if self.last_focus_decrease_time is None or current_time - self.last_focus_decrease_time >= SCORE_STEP - 1e-6:
+                    self.focus_score = max(0, self.focus_score - config.DISCOUNT_EYES)
+                    self.blink_start_time = current_time
+        else:
+            self.blink_detected = False
+
+        return self.focus_score
+
+
+def score_signals(timestamps, face_codes, eye_codes, blink_ratios, focus_score=50):
+    # Score a whole recording from its per-frame signal arrays with FocusScorer's own state
+    # machine. The label tests are done once over the arrays and folded into one state per
+    # frame, so a stored analysis can be re-scored on every sidebar change.
+    step = FocusScorer(focus_score).step
+    states = signal_states(face_codes, eye_codes, blink_ratios).tolist()
+    timestamps = np.asarray(timestamps, dtype=np.float64).tolist()
+    return np.array([step(current_time, state) for current_time, state in zip(timestamps, states)], dtype=np.float32)
@@ -0,0 +1,101 @@
+import numpy as np
+
+from constants import EYE_DIRECTIONS, FACE_POSITIONS, FACE_POSITION_CODES
+
+# Eye directions and face positions that count towards the report's pie charts
+REPORTED_EYE_DIRECTIONS = [EYE_DIRECTIONS.index(label) for label in ("Left", "Right", "Center")]
+REPORTED_FACE_POSITIONS = [code for code, label in enumerate(FACE_POSITIONS) if label != "Not Detected"]
+NOT_DETECTED = FACE_POSITION_CODES["Not Detected"]
+
+
+class SessionSummary:
+    # Running totals for the focus report, updated as frames are scored, so every
+    # summary statistic is available without another pass over the results. Each
+    # frame is credited with the time since the previous frame.
+    def __init__(self):
+        self.previous_time = None
+        self.eye_direction_time = np.zeros(len(EYE_DIRECTIONS))
+        self.eye_direction_frames = np.zeros(len(EYE_DIRECTIONS), dtype=np.int64)
+        self.face_position_time = np.zeros(len(FACE_POSITIONS))
+        self.face_position_frames = np.zeros(len(FACE_POSITIONS), dtype=np.int64)
+        self.reset_scores()
+
+    def reset_scores(self):
+        self.frames = 0
+        self.score_total = 0.0
+        self.max_score = None
+        self.min_score = None
+
+    def update(self, timestamp, eye_code, face_code, focus_score):
+        delta_time = timestamp - self.previous_time if self.previous_time is not None else 0.0
+        self.previous_time = timestamp
+        self.eye_direction_time[eye_code] += delta_time
+        self.eye_direction_frames[eye_code] += 1
+        self.face_position_time[face_code] += delta_time
+        self.face_position_frames[face_code] += 1
+        self.add_scores([focus_score])
+
+    def update_many(self, timestamps, eye_codes, face_codes, focus_scores):
+        # Same as calling update for each frame in order
+        if len(timestamps) == 0:
+            return
+        delta_time = np.diff(timestamps, prepend=timestamps[0] if self.previous_time is None else self.previous_time)
+        self.previous_time = float(timestamps[-1])
+        self.eye_direction_time += np.bincount(eye_codes, delta_time, len(EYE_DIRECTIONS))
+        self.eye_direction_frames += np.bincount(eye_codes, minlength=len(EYE_DIRECTIONS))
+        self.face_position_time += np.bincount(face_codes, delta_time, len(FACE_POSITIONS))
+        self.face_position_frames += np.bincount(face_codes, minlength=len(FACE_POSITIONS))
+        self.add_scores(focus_scores)
+
+    def add_scores(self, focus_scores):
+        focus_scores = np.asarray(focus_scores, dtype=np.float64)
+        if len(focus_scores) == 0:
+            return
+        self.frames += len(focus_scores)
+        self.score_total += focus_scores.sum()
+        high, low = focus_scores.max(), focus_scores.min()
+        self.max_score = high if self.max_score is None else max(self.max_score, high)
+        self.min_score = low if self.min_score is None else min(self.min_score, low)
+
+    @property
+    def mean_score(self):
+        return self.score_total / self.frames if self.frames else None
+
+    def _shares(self, labels, times, frames, codes):
+        # Percentage of the time spent in each of `codes` that was seen at least once
+        codes = [code for code in codes if frames[code]]
+        total = times[codes].sum()
+        percentages = times[codes] / total * 100 if total > 0 else np.zeros(len(codes))
+        return [labels[code] for code in codes], np.round(percentages, 2).tolist()
+
+    def eye_direction_shares(self):
+        return self._shares(EYE_DIRECTIONS, self.eye_direction_time, self.eye_direction_frames, REPORTED_EYE_DIRECTIONS)
+
+    def face_position_shares(self):
+        return self._shares(FACE_POSITIONS, self.face_position_time, self.face_position_frames, REPORTED_FACE_POSITIONS)
+
+    def front_camera_shares(self):
+        # [front camera, not front camera] percentages of the total time
+        not_front_time = self.face_position_time[NOT_DETECTED]
+        total = self.face_position_time.sum()
+        if total <= 0:
+            return [0.0, 0.0]
+        return np.round([(total - not_front_time) / total * 100, not_front_time / total * 100], 2).tolist()
+
+    def chart_data(self, labels_linechart, data_linechart):
+        eye_direction_labels, eye_direction_percentages = self.eye_direction_shares()
+        face_position_labels, face_position_percentages = self.face_position_shares()
+        return {
+            "line_chart": {"labels": labels_linechart, "data": data_linechart},
+            "pie_chart1": {"labels": eye_direction_labels, "data": eye_direction_percentages},
+            "pie_chart2": {"labels": face_position_labels, "data": face_position_percentages},
+            "pie_chart3": {"labels": ["Front Camera", "Not Front Camera"], "data": self.front_camera_shares()},
+        }
+
+    def scores(self, avg_focus_score_after_quiz):
+        return {
+            "final": f"{avg_focus_score_after_quiz:.2f}%",
+            "highest_continuous": f"{self.max_score:.2f}%",
+            "min": f"{self.min_score:.2f}%",
+            "after_quiz": f"{avg_focus_score_after_quiz:.2f}%",
+        }
@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from constants import config
+
+# Bump when the meaning or layout of the extracted signals changes, so stale entries
+# are never read back
+CACHE_VERSION = 2
+
+
+def cache_key(video_digest, settings):
+    # Entries are keyed by the video content and every setting that changes the extracted signals
+    payload = json.dumps({"video": video_digest, "version": CACHE_VERSION, "settings": settings}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load(key):
+    # Return the cached columns memory-mapped from disk, or None on a miss
+    entry = os.path.join(config.SIGNAL_CACHE_DIR, key)
+    try:
+        with open(os.path.join(entry, "columns.json"), "r", encoding="utf-8") as f:
+            columns = json.load(f)
+        arrays = {name: np.load(os.path.join(entry, f"{name}.npy"), mmap_mode="r") for name in columns}
+        os.utime(entry)  # Mark as recently used for LRU eviction
+    except (OSError, ValueError):
+        return None
+    return arrays
+
+
+def store(key, arrays):
+    os.makedirs(config.SIGNAL_CACHE_DIR, exist_ok=True)
+    entry = os.path.join(config.SIGNAL_CACHE_DIR, key)
+
+    # Write into a private directory and rename it into place, so readers never see a partial entry
+    partial = tempfile.mkdtemp(prefix=".partial-", dir=config.SIGNAL_CACHE_DIR)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(partial, f"{name}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(partial, "columns.json"), "w", encoding="utf-8") as f:
+            json.dump(list(arrays), f)
+        os.rename(partial, entry)
+    except OSError:
+        # Another process stored the same entry first, or the disk is full
+        shutil.rmtree(partial, ignore_errors=True)
+    evict(config.SIGNAL_CACHE_MAX_BYTES)
+
+
+def evict(max_bytes):
+    # Drop least recently used entries until the cache fits in max_bytes
+    entries = []
+    for name in os.listdir(config.SIGNAL_CACHE_DIR):
+        entry = os.path.join(config.SIGNAL_CACHE_DIR, name)
+        if name.startswith(".") or not os.path.isdir(entry):
+            continue
+        try:
+            size = sum(f.stat().st_size for f in os.scandir(entry))
+            entries.append((os.stat(entry).st_mtime, size, entry))
+        except OSError:
+            continue
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
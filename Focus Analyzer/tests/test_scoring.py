@@ -0,0 +1,78 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from classroom import ClassroomScorer
+from constants import config, EYE_DIRECTION_CODES, FACE_POSITION_CODES
+from scoring import FocusScorer, score_signals, signal_states
+
+# score_signals and ClassroomScorer must give exactly the scores FocusScorer.update gives,
+# over random signals and random sidebar thresholds.
+
+FACE_LABELS = list(FACE_POSITION_CODES)
+EYE_LABELS = list(EYE_DIRECTION_CODES)
+THRESHOLDS = ('CENTER_THRESHOLD', 'SIDE_THRESHOLD', 'BLINK_THRESHOLD', 'DISCOUNT_SIDE', 'DISCOUNT_EYES')
+
+
+@pytest.fixture
+def thresholds(request):
+    saved = {name: getattr(config, name) for name in THRESHOLDS}
+    rng = np.random.default_rng(request.param)
+    config.CENTER_THRESHOLD = rng.uniform(0, 3)
+    config.SIDE_THRESHOLD = rng.uniform(0, 3)
+    config.BLINK_THRESHOLD = rng.uniform(0, 3)
+    config.DISCOUNT_SIDE = rng.uniform(0, 5)
+    config.DISCOUNT_EYES = rng.uniform(0, 30)
+    yield rng
+    vars(config).update(saved)
+
+
+def random_signals(rng, frames):
+    # Labels held for random runs of frames, so thresholds are crossed, at an uneven frame
+    # rate with occasional gaps as subsampled analysis gives
+    runs = rng.integers(1, 60, frames)
+    faces = np.repeat(rng.integers(0, len(FACE_LABELS), frames), runs)[:frames]
+    eyes = np.repeat(rng.integers(0, len(EYE_LABELS), frames), runs)[:frames]
+    ratios = np.repeat(rng.uniform(3, 7, frames), runs)[:frames]
+    gaps = np.where(rng.random(frames) < 0.05, rng.uniform(0.1, 1, frames), rng.uniform(0.01, 0.07, frames))
+    return np.cumsum(gaps), [FACE_LABELS[code] for code in faces], [EYE_LABELS[code] for code in eyes], ratios
+
+
+def reference_scores(timestamps, faces, eyes, ratios):
+    scorer = FocusScorer()
+    return np.array([scorer.update(*frame) for frame in zip(timestamps, faces, eyes, ratios)], dtype=np.float32)
+
+
+@pytest.mark.parametrize('thresholds', range(20), indirect=True)
+def test_score_signals_matches_focus_scorer(thresholds):
+    timestamps, faces, eyes, ratios = random_signals(thresholds, 3000)
+    face_codes = np.array([FACE_POSITION_CODES[label] for label in faces], dtype=np.int8)
+    eye_codes = np.array([EYE_DIRECTION_CODES[label] for label in eyes], dtype=np.int8)
+    scores = score_signals(timestamps, face_codes, eye_codes, ratios)
+    np.testing.assert_array_equal(scores, reference_scores(timestamps, faces, eyes, ratios))
+
+
+@pytest.mark.parametrize('thresholds', range(20), indirect=True)
+def test_classroom_scorer_matches_focus_scorer(thresholds):
+    # Students join at different frames and are only scored on the frames they are tracked
+    students, frames = 6, 2000
+    timestamps, *_ = random_signals(thresholds, frames)
+    signals = [random_signals(thresholds, frames)[1:] for _ in range(students)]
+    joined = thresholds.integers(0, frames // 2, students)
+    scored = (np.arange(frames)[:, None] >= joined) & (thresholds.random((frames, students)) < 0.9)
+
+    classroom = ClassroomScorer()
+    scores = np.full((frames, students), np.nan)
+    for frame, current_time in enumerate(timestamps):
+        present = int(np.max(np.flatnonzero(joined <= frame), initial=-1)) + 1
+        states = np.array([signal_states([FACE_POSITION_CODES[faces[frame]]], [EYE_DIRECTION_CODES[eyes[frame]]], [ratios[frame]])[0]
+                           for faces, eyes, ratios in signals[:present]], dtype=np.int64)
+        scores[frame, :present] = classroom.update(current_time, states, scored[frame, :present])
+
+    for student, (faces, eyes, ratios) in enumerate(signals):
+        rows = np.flatnonzero(scored[:, student])
+        expected = reference_scores(timestamps[rows], *(np.asarray(column)[rows] for column in (faces, eyes, ratios)))
+        np.testing.assert_allclose(scores[rows, student], expected, rtol=0, atol=1e-4)
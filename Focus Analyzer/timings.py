@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+from constants import config
+
+# Rolling per-stage timings of the analysis pipeline. Every stage keeps its last
+# TIMINGS_WINDOW durations in a ring buffer, from which percentiles are read on demand.
+# While config.TIMINGS_ENABLED is off, stage() hands out one shared no-op context and
+# nothing is measured or stored.
+
+_NO_STAGE = nullcontext()
+_lock = threading.Lock()
+_stages = {}
+
+
+class StageSamples:
+    def __init__(self, window):
+        self.samples = np.zeros(window)
+        self.count = 0  # Durations recorded in total, including those rolled out of the window
+
+    def add(self, seconds):
+        self.samples[self.count % len(self.samples)] = seconds
+        self.count += 1
+
+    def add_many(self, seconds, count=None):
+        # `count` is the number of durations these are the most recent of
+        seconds = np.asarray(seconds, dtype=np.float64)[-len(self.samples):]
+        slots = (self.count + np.arange(len(seconds))) % len(self.samples)
+        self.samples[slots] = seconds
+        self.count += len(seconds) if count is None else count
+
+    def window(self):
+        return self.samples[:min(self.count, len(self.samples))]
+
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start)
+
+
+def stage(name):
+    # Context manager timing one run of a stage: `with timings.stage("face_mesh"): ...`
+    return _Stage(name) if config.TIMINGS_ENABLED else _NO_STAGE
+
+
+def _samples(name):
+    samples = _stages.get(name)
+    if samples is None:
+        samples = _stages[name] = StageSamples(config.TIMINGS_WINDOW)
+    return samples
+
+
+def record(name, seconds):
+    with _lock:
+        _samples(name).add(seconds)
+
+
+def drain():
+    # Take every stage's window and clear it; used by worker processes to hand their
+    # timings back with their results
+    with _lock:
+        drained = {name: (samples.window().copy(), samples.count) for name, samples in _stages.items()}
+        _stages.clear()
+    return drained
+
+
+def merge(drained):
+    # Add the output of drain() from another process
+    with _lock:
+        for name, (seconds, count) in drained.items():
+            _samples(name).add_many(seconds, count)
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+
+
+def summary():
+    # {stage: {count, mean_ms, p50_ms, p95_ms, p99_ms}} over each stage's rolling window
+    with _lock:
+        windows = {name: (samples.window().copy(), samples.count) for name, samples in _stages.items()}
+    stats = {}
+    for name, (seconds, count) in windows.items():
+        if not len(seconds):
+            continue
+        p50, p95, p99 = np.percentile(seconds, [50, 95, 99]) * 1000
+        stats[name] = {'count': count, 'mean_ms': float(seconds.mean() * 1000),
+                       'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+    return stats
+
+
+def to_json():
+    return json.dumps({'window': config.TIMINGS_WINDOW, 'stages': summary()}, indent=2)